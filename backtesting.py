@@ -1,8 +1,11 @@
 from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Set, Tuple
+from typing import Callable, Dict, Generator, List, Tuple
 from functools import lru_cache, partial
+from heapq import merge
 from copy import copy
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import traceback
 
 import numpy as np
@@ -12,7 +15,7 @@ from pandas import DataFrame
 
 from vnpy.trader.constant import Direction, Offset, Interval, Status
 from vnpy.trader.database import get_database
-from vnpy.trader.object import OrderData, TradeData, BarData
+from vnpy.trader.object import OrderData, TradeData, BarData, TickData
 from vnpy.trader.utility import round_to, extract_vt_symbol
 from vnpy.trader.optimize import (
     OptimizationSetting,
@@ -21,14 +24,24 @@ from vnpy.trader.optimize import (
     run_ga_optimization
 )
 
+from .base import BacktestingMode, INTERVAL_DELTA_MAP
 from .template import StrategyTemplate
+from .cache import get_bar_cache
+from .utility import (
+    PortfolioBarArray,
+    PortfolioBarFanout,
+    PortfolioBarGenerator,
+    TradingCalendar,
+    bars_to_array,
+    is_synthetic
+)
+
 
+# Length of tick data loaded from database each time in tick mode
+TICK_LOAD_DELTA = timedelta(hours=1)
 
-INTERVAL_DELTA_MAP = {
-    Interval.MINUTE: timedelta(minutes=1),
-    Interval.HOUR: timedelta(hours=1),
-    Interval.DAILY: timedelta(days=1),
-}
+# History data attached from shared memory in optimization worker process
+shared_history_data: Dict[str, PortfolioBarArray] = {}
 
 
 class BacktestingEngine:
@@ -39,6 +52,7 @@ class BacktestingEngine:
     def __init__(self):
         """"""
         self.vt_symbols: List[str] = []
+        self.mode: BacktestingMode = BacktestingMode.BAR
         self.start: datetime = None
         self.end: datetime = None
 
@@ -49,20 +63,30 @@ class BacktestingEngine:
 
         self.capital: float = 1_000_000
         self.risk_free: float = 0
+        self.use_cache: bool = False
+        self.incremental_accounting: bool = False
+        self.streaming: bool = False
 
         self.strategy_class: StrategyTemplate = None
         self.strategy: StrategyTemplate = None
         self.bars: Dict[str, BarData] = {}
+        self.ticks: Dict[str, TickData] = {}
+        self.tick: TickData = None
         self.datetime: datetime = None
 
         self.interval: Interval = None
         self.days: int = 0
-        self.history_data: Dict[Tuple, BarData] = {}
-        self.dts: Set[datetime] = set()
+        self.history_data: PortfolioBarArray = None
+        self.bar_fanout: PortfolioBarFanout = None
+        self.bar_generator: PortfolioBarGenerator = None
+        self.strategy_generators: List[PortfolioBarGenerator] = []
+        self.bar_flush_grace: float = 2
 
         self.limit_order_count = 0
         self.limit_orders = {}
         self.active_limit_orders = {}
+        self.order_books: Dict[str, LimitOrderBook] = defaultdict(LimitOrderBook)
+        self.submitting_orders: Dict[str, OrderData] = {}
 
         self.trade_count = 0
         self.trades = {}
@@ -71,18 +95,26 @@ class BacktestingEngine:
 
         self.daily_results = {}
         self.daily_df = None
+        self.closed_net_pnl: float = 0
 
     def clear_data(self) -> None:
         """
         Clear all data of last backtesting.
         """
         self.strategy = None
+        self.bar_fanout = None
+        self.bar_generator = None
+        self.strategy_generators = []
         self.bars = {}
+        self.ticks = {}
+        self.tick = None
         self.datetime = None
 
         self.limit_order_count = 0
         self.limit_orders.clear()
         self.active_limit_orders.clear()
+        self.order_books.clear()
+        self.submitting_orders.clear()
 
         self.trade_count = 0
         self.trades.clear()
@@ -90,6 +122,7 @@ class BacktestingEngine:
         self.logs.clear()
         self.daily_results.clear()
         self.daily_df = None
+        self.closed_net_pnl = 0
 
     def set_parameters(
         self,
@@ -102,9 +135,14 @@ class BacktestingEngine:
         priceticks: Dict[str, float],
         capital: int = 0,
         end: datetime = None,
-        risk_free: float = 0
+        risk_free: float = 0,
+        use_cache: bool = False,
+        incremental_accounting: bool = False,
+        mode: BacktestingMode = BacktestingMode.BAR,
+        streaming: bool = False
     ) -> None:
         """"""
+        self.mode = mode
         self.vt_symbols = vt_symbols
         self.interval = interval
 
@@ -117,6 +155,9 @@ class BacktestingEngine:
         self.end = end
         self.capital = capital
         self.risk_free = risk_free
+        self.use_cache = use_cache
+        self.incremental_accounting = incremental_accounting
+        self.streaming = streaming
 
     def add_strategy(self, strategy_class: type, setting: dict) -> None:
         """"""
@@ -125,8 +166,11 @@ class BacktestingEngine:
             self, strategy_class.__name__, copy(self.vt_symbols), setting
         )
 
-    def load_data(self) -> None:
-        """"""
+    def load_data(self, max_workers: int = 1) -> None:
+        """
+        Load history data, symbol and date range chunks are queried
+        concurrently by a thread pool if max_workers is larger than 1.
+        """
         self.output("开始加载历史数据")
 
         if not self.end:
@@ -137,71 +181,328 @@ class BacktestingEngine:
             return
 
         # Clear previously loaded history data
-        self.history_data.clear()
-        self.dts.clear()
+        self.history_data = None
+
+        # Tick data is streamed from database during replay
+        if self.mode == BacktestingMode.TICK:
+            self.output("Tick模式下数据在回放时分段加载")
+            return
+
+        # Bar data is loaded chunk by chunk during replay in streaming mode
+        if self.streaming:
+            self.output("流式回放模式下数据在回放时分段加载")
+            return
 
         # Load 30 days of data each time and allow for progress update
+        windows: List[Tuple[datetime, datetime]] = self.get_load_windows()
+
+        if not windows:
+            self.output("所有历史数据加载完成")
+            return
+
+        if max_workers > 1:
+            chunks: Dict[str, list] = self.load_chunks_concurrently(windows, max_workers)
+        else:
+            chunks: Dict[str, list] = self.load_chunks(windows)
+
+        columns: Dict[str, Tuple[List[datetime], np.ndarray]] = {}
+
+        for vt_symbol in self.vt_symbols:
+            symbol_dts: List[datetime] = []
+            for dts, _ in chunks[vt_symbol]:
+                symbol_dts.extend(dts)
+
+            symbol_values: np.ndarray = np.concatenate(
+                [values for _, values in chunks[vt_symbol]]
+            )
+            columns[vt_symbol] = (symbol_dts, symbol_values)
+
+        # Align data of all symbols into columnar arrays
+        self.history_data = PortfolioBarArray.from_arrays(
+            self.vt_symbols,
+            columns,
+            self.interval,
+            self.gateway_name
+        )
+
+        self.output("所有历史数据加载完成")
+
+    def get_load_windows(self) -> List[Tuple[datetime, datetime]]:
+        """
+        Split backtesting date range into 30 days windows.
+        """
         progress_delta = timedelta(days=30)
-        total_delta = self.end - self.start
         interval_delta = INTERVAL_DELTA_MAP[self.interval]
 
-        for vt_symbol in self.vt_symbols:
-            start = self.start
-            end = self.start + progress_delta
-            progress = 0
+        windows: List[Tuple[datetime, datetime]] = []
+
+        start = self.start
+        end = self.start + progress_delta
 
+        while start < self.end:
+            end = min(end, self.end)  # Make sure end time stays within set range
+            windows.append((start, end))
+
+            start = end + interval_delta
+            end += (progress_delta + interval_delta)
+
+        return windows
+
+    def load_chunks(self, windows: List[Tuple[datetime, datetime]]) -> Dict[str, list]:
+        """
+        Load data of each symbol and window one by one.
+        """
+        chunks: Dict[str, list] = {}
+
+        for vt_symbol in self.vt_symbols:
+            symbol_chunks: list = []
             data_count = 0
-            while start < self.end:
-                end = min(end, self.end)  # Make sure end time stays within set range
 
-                data = load_bar_data(
+            for start, end in windows:
+                dts, values = load_bar_data(
                     vt_symbol,
                     self.interval,
                     start,
-                    end
+                    end,
+                    self.use_cache
                 )
 
-                for bar in data:
-                    self.dts.add(bar.datetime)
-                    self.history_data[(bar.datetime, vt_symbol)] = bar
-                    data_count += 1
+                symbol_chunks.append((dts, values))
+                data_count += len(dts)
 
-                progress += progress_delta / total_delta
-                progress = min(progress, 1)
-                progress_bar = "#" * int(progress * 10)
-                self.output(f"{vt_symbol}加载进度：{progress_bar} [{progress:.0%}]")
-
-                start = end + interval_delta
-                end += (progress_delta + interval_delta)
+                self.output_load_progress(vt_symbol, len(symbol_chunks) / len(windows))
 
+            chunks[vt_symbol] = symbol_chunks
             self.output(f"{vt_symbol}历史数据加载完成，数据量：{data_count}")
 
-        self.output("所有历史数据加载完成")
+        return chunks
+
+    def load_chunks_concurrently(
+        self,
+        windows: List[Tuple[datetime, datetime]],
+        max_workers: int
+    ) -> Dict[str, list]:
+        """
+        Load data of all symbol and window chunks with a thread pool.
+        """
+        chunks: Dict[str, list] = {
+            vt_symbol: [None] * len(windows) for vt_symbol in self.vt_symbols
+        }
+        finished: Dict[str, int] = defaultdict(int)
+        data_counts: Dict[str, int] = defaultdict(int)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures: dict = {}
+
+            for vt_symbol in self.vt_symbols:
+                for i, (start, end) in enumerate(windows):
+                    future = executor.submit(
+                        load_bar_data,
+                        vt_symbol,
+                        self.interval,
+                        start,
+                        end,
+                        self.use_cache
+                    )
+                    futures[future] = (vt_symbol, i)
+
+            # Results are put by window index, so the order of data is the same
+            # as loading one by one.
+            for future in as_completed(futures):
+                vt_symbol, i = futures[future]
+                dts, values = future.result()
+
+                chunks[vt_symbol][i] = (dts, values)
+                finished[vt_symbol] += 1
+                data_counts[vt_symbol] += len(dts)
+
+                self.output_load_progress(vt_symbol, finished[vt_symbol] / len(windows))
+
+                if finished[vt_symbol] == len(windows):
+                    self.output(f"{vt_symbol}历史数据加载完成，数据量：{data_counts[vt_symbol]}")
+
+        return chunks
+
+    def output_load_progress(self, vt_symbol: str, progress: float) -> None:
+        """"""
+        progress_bar = "#" * int(progress * 10)
+        self.output(f"{vt_symbol}加载进度：{progress_bar} [{progress:.0%}]")
 
     def run_backtesting(self) -> None:
         """"""
+        if self.mode == BacktestingMode.TICK:
+            self.run_tick_backtesting()
+            return
+
+        if not self.streaming and not self.history_data:
+            self.output("历史数据为空，无法回测")
+            return
+
         self.strategy.on_init()
 
-        # Generate sorted datetime list
-        dts = list(self.dts)
-        dts.sort()
+        # Row index of history data, which is switched chunk by chunk in
+        # streaming mode
+        rows = self.iterate_history_rows()
 
         # Use the first [days] of history data for initializing strategy
         day_count = 0
-        ix = 0
+        ix = None
+
+        if self.strategy.columnar_warmup and self.streaming:
+            self.output("流式回放模式下不支持columnar_warmup，使用逐条K线初始化")
+
+        try:
+            if self.strategy.columnar_warmup and not self.streaming:
+                ix = self.warmup_history()
+                rows = iter(range(ix + 1, len(self.history_data)))
+
+                if ix == len(self.history_data):
+                    ix = None
+            else:
+                for ix in rows:
+                    dt = self.history_data.dts[ix]
+
+                    if self.datetime and dt.day != self.datetime.day:
+                        day_count += 1
+                        if day_count >= self.days:
+                            break
+
+                    self.new_bars(ix)
+                else:
+                    ix = None
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
+
+        self.strategy.inited = True
+        self.output("策略初始化完成")
+
+        self.strategy.on_start()
+        self.strategy.trading = True
+        self.output("开始回放历史数据")
+
+        # Use the rest of history data for running backtesting, starting
+        # from the row which ended initialization.
+        try:
+            if ix is not None:
+                self.new_bars(ix)
+
+            for ix in rows:
+                self.new_bars(ix)
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
+
+        self.output("历史数据回放结束")
+
+    def warmup_history(self) -> int:
+        """
+        Push history data of the first [days] to strategy at once with
+        on_history, return the row index ending initialization.
+        """
+        dts: List[datetime] = self.history_data.dts
+
+        day_count = 0
+        end = len(dts)
 
-        for ix, dt in enumerate(dts):
-            if self.datetime and dt.day != self.datetime.day:
+        for ix in range(1, len(dts)):
+            if dts[ix].day != dts[ix - 1].day:
                 day_count += 1
                 if day_count >= self.days:
+                    end = ix
                     break
 
-            try:
-                self.new_bars(dt)
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
+        history_data: PortfolioBarArray = self.history_data.get_rows(0, end)
+        self.strategy.on_history(history_data)
+
+        # Window bars subscribed are warmed up from the same array
+        if self.bar_fanout:
+            self.bar_fanout.update_history(history_data)
+
+        # Keep the last bars for crossing orders and backfilling after init
+        last = end - 1
+        for col, vt_symbol in enumerate(self.vt_symbols):
+            if history_data.valid[last, col] or history_data.synthetic[last, col]:
+                self.bars[vt_symbol] = history_data.get_bar(last, col)
+
+        self.datetime = dts[last]
+
+        return end
+
+    def iterate_history_rows(self) -> Generator[int, None, None]:
+        """
+        Generate row index for replay. In streaming mode each 30 days chunk
+        is loaded and aligned into history data, then released after replay.
+        """
+        if not self.streaming:
+            yield from range(len(self.history_data))
+            return
+
+        last_closes = None
+
+        for start, end in self.get_load_windows():
+            columns = {}
+
+            for vt_symbol in self.vt_symbols:
+                # Skip lru_cache which would keep every chunk in memory
+                columns[vt_symbol] = load_bar_data.__wrapped__(
+                    vt_symbol,
+                    self.interval,
+                    start,
+                    end,
+                    self.use_cache
+                )
+
+            self.history_data = PortfolioBarArray.from_arrays(
+                self.vt_symbols,
+                columns,
+                self.interval,
+                self.gateway_name,
+                last_closes
+            )
+            self.output(f"数据流加载：{start} - {end}，数据量：{len(self.history_data)}")
+
+            yield from range(len(self.history_data))
+
+            # Empty chunk keeps close prices carried over from earlier ones
+            last_closes = self.history_data.get_last_closes(last_closes)
+
+        self.history_data = None
+
+    def run_tick_backtesting(self) -> None:
+        """
+        Replay ticks of all symbols merged in time order.
+        """
+        if not self.end:
+            self.end = datetime.now()
+
+        self.strategy.on_init()
+
+        if self.strategy.columnar_warmup:
+            self.output("Tick模式下不支持columnar_warmup，使用逐笔Tick初始化")
+
+        ticks = load_tick_stream(self.vt_symbols, self.start, self.end)
+
+        # Use the first [days] of history data for initializing strategy
+        day_count = 0
+        tick = None
+
+        try:
+            for tick in ticks:
+                if self.datetime and tick.datetime.day != self.datetime.day:
+                    day_count += 1
+                    if day_count >= self.days:
+                        break
+
+                self.new_tick(tick)
+            else:
+                tick = None
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
 
         self.strategy.inited = True
         self.output("策略初始化完成")
@@ -210,14 +511,18 @@ class BacktestingEngine:
         self.strategy.trading = True
         self.output("开始回放历史数据")
 
-        # Use the rest of history data for running backtesting
-        for dt in dts[ix:]:
-            try:
-                self.new_bars(dt)
-            except Exception:
-                self.output("触发异常，回测终止")
-                self.output(traceback.format_exc())
-                return
+        # Use the rest of history data for running backtesting, starting
+        # from the tick which ended initialization.
+        try:
+            if tick:
+                self.new_tick(tick)
+
+            for tick in ticks:
+                self.new_tick(tick)
+        except Exception:
+            self.output("触发异常，回测终止")
+            self.output(traceback.format_exc())
+            return
 
         self.output("历史数据回放结束")
 
@@ -229,6 +534,37 @@ class BacktestingEngine:
             self.output("成交记录为空，无法计算")
             return
 
+        # Daily results are already updated during replay in incremental
+        # accounting mode, only the last day is left to be finished.
+        if self.incremental_accounting:
+            if self.daily_results:
+                daily_result = next(reversed(self.daily_results.values()))
+                daily_result.update_pnl()
+        else:
+            self.calculate_daily_results()
+
+        # Generate dataframe
+        results = defaultdict(list)
+
+        for daily_result in self.daily_results.values():
+            fields = [
+                "date", "trade_count", "turnover",
+                "commission", "slippage", "trading_pnl",
+                "holding_pnl", "total_pnl", "net_pnl"
+            ]
+            for key in fields:
+                value = getattr(daily_result, key)
+                results[key].append(value)
+
+        self.daily_df = DataFrame.from_dict(results).set_index("date")
+
+        self.output("逐日盯市盈亏计算完成")
+        return self.daily_df
+
+    def calculate_daily_results(self) -> None:
+        """
+        Calculate pnl of all daily results with trades after replay.
+        """
         # Add trade data into daily reuslt.
         for trade in self.trades.values():
             d = trade.datetime.date()
@@ -251,24 +587,6 @@ class BacktestingEngine:
             pre_closes = daily_result.close_prices
             start_poses = daily_result.end_poses
 
-        # Generate dataframe
-        results = defaultdict(list)
-
-        for daily_result in self.daily_results.values():
-            fields = [
-                "date", "trade_count", "turnover",
-                "commission", "slippage", "trading_pnl",
-                "holding_pnl", "total_pnl", "net_pnl"
-            ]
-            for key in fields:
-                value = getattr(daily_result, key)
-                results[key].append(value)
-
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
-
-        self.output("逐日盯市盈亏计算完成")
-        return self.daily_df
-
     def calculate_statistics(self, df: DataFrame = None, output=True) -> None:
         """"""
         self.output("开始计算策略统计指标")
@@ -280,153 +598,80 @@ class BacktestingEngine:
         # Check for init DataFrame
         if df is None:
             # Set all statistics to 0 if no trade.
-            start_date = ""
-            end_date = ""
-            total_days = 0
-            profit_days = 0
-            loss_days = 0
-            end_balance = 0
-            max_drawdown = 0
-            max_ddpercent = 0
-            max_drawdown_duration = 0
-            total_net_pnl = 0
-            daily_net_pnl = 0
-            total_commission = 0
-            daily_commission = 0
-            total_slippage = 0
-            daily_slippage = 0
-            total_turnover = 0
-            daily_turnover = 0
-            total_trade_count = 0
-            daily_trade_count = 0
-            total_return = 0
-            annual_return = 0
-            daily_return = 0
-            return_std = 0
-            sharpe_ratio = 0
-            return_drawdown_ratio = 0
+            statistics = {key: 0 for key in STATISTICS_KEYS}
+            statistics["start_date"] = ""
+            statistics["end_date"] = ""
+            statistics["capital"] = self.capital
         else:
             # Calculate balance related time series data
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-            df["return"] = np.log(df["balance"] / df["balance"].shift(1)).fillna(0)
-            df["highlevel"] = (
-                df["balance"].rolling(
-                    min_periods=1, window=len(df), center=False).max()
+            net_pnl = df["net_pnl"].to_numpy(dtype=np.float64)[np.newaxis, :]
+            balance, returns, highlevel, drawdown, ddpercent = calculate_balance(
+                net_pnl, self.capital
             )
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
 
-            # Calculate statistics value
-            start_date = df.index[0]
-            end_date = df.index[-1]
-
-            total_days = len(df)
-            profit_days = len(df[df["net_pnl"] > 0])
-            loss_days = len(df[df["net_pnl"] < 0])
-
-            end_balance = df["balance"].iloc[-1]
-            max_drawdown = df["drawdown"].min()
-            max_ddpercent = df["ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
-
-            if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
-                max_drawdown_duration = (max_drawdown_end - max_drawdown_start).days
-            else:
-                max_drawdown_duration = 0
-
-            total_net_pnl = df["net_pnl"].sum()
-            daily_net_pnl = total_net_pnl / total_days
-
-            total_commission = df["commission"].sum()
-            daily_commission = total_commission / total_days
+            df["balance"] = balance[0]
+            df["return"] = returns[0]
+            df["highlevel"] = highlevel[0]
+            df["drawdown"] = drawdown[0]
+            df["ddpercent"] = ddpercent[0]
 
-            total_slippage = df["slippage"].sum()
-            daily_slippage = total_slippage / total_days
-
-            total_turnover = df["turnover"].sum()
-            daily_turnover = total_turnover / total_days
-
-            total_trade_count = df["trade_count"].sum()
-            daily_trade_count = total_trade_count / total_days
-
-            total_return = (end_balance / self.capital - 1) * 100
-            annual_return = total_return / total_days * 240
-            daily_return = df["return"].mean() * 100
-            return_std = df["return"].std() * 100
-
-            if return_std:
-                daily_risk_free = self.risk_free / np.sqrt(240)
-                sharpe_ratio = (daily_return - daily_risk_free) / return_std * np.sqrt(240)
-            else:
-                sharpe_ratio = 0
+            # Calculate statistics value
+            dates = None
+            if isinstance(df.index[0], date):
+                dates = list(df.index)
+
+            batch_statistics = calculate_statistics_batch(
+                net_pnl,
+                self.capital,
+                self.risk_free,
+                dates=dates,
+                commission=df["commission"].to_numpy(dtype=np.float64)[np.newaxis, :],
+                slippage=df["slippage"].to_numpy(dtype=np.float64)[np.newaxis, :],
+                turnover=df["turnover"].to_numpy(dtype=np.float64)[np.newaxis, :],
+                trade_count=df["trade_count"].to_numpy(dtype=np.float64)[np.newaxis, :],
+            )
 
-            return_drawdown_ratio = -total_net_pnl / max_drawdown
+            statistics = {key: value[0] for key, value in batch_statistics.items()}
+            statistics["start_date"] = df.index[0]
+            statistics["end_date"] = df.index[-1]
 
         # Output
         if output:
-            self.output("-" * 30)
-            self.output(f"首个交易日：\t{start_date}")
-            self.output(f"最后交易日：\t{end_date}")
-
-            self.output(f"总交易日：\t{total_days}")
-            self.output(f"盈利交易日：\t{profit_days}")
-            self.output(f"亏损交易日：\t{loss_days}")
-
-            self.output(f"起始资金：\t{self.capital:,.2f}")
-            self.output(f"结束资金：\t{end_balance:,.2f}")
-
-            self.output(f"总收益率：\t{total_return:,.2f}%")
-            self.output(f"年化收益：\t{annual_return:,.2f}%")
-            self.output(f"最大回撤: \t{max_drawdown:,.2f}")
-            self.output(f"百分比最大回撤: {max_ddpercent:,.2f}%")
-            self.output(f"最长回撤天数: \t{max_drawdown_duration}")
-
-            self.output(f"总盈亏：\t{total_net_pnl:,.2f}")
-            self.output(f"总手续费：\t{total_commission:,.2f}")
-            self.output(f"总滑点：\t{total_slippage:,.2f}")
-            self.output(f"总成交金额：\t{total_turnover:,.2f}")
-            self.output(f"总成交笔数：\t{total_trade_count}")
-
-            self.output(f"日均盈亏：\t{daily_net_pnl:,.2f}")
-            self.output(f"日均手续费：\t{daily_commission:,.2f}")
-            self.output(f"日均滑点：\t{daily_slippage:,.2f}")
-            self.output(f"日均成交金额：\t{daily_turnover:,.2f}")
-            self.output(f"日均成交笔数：\t{daily_trade_count}")
-
-            self.output(f"日均收益率：\t{daily_return:,.2f}%")
-            self.output(f"收益标准差：\t{return_std:,.2f}%")
-            self.output(f"Sharpe Ratio：\t{sharpe_ratio:,.2f}")
-            self.output(f"收益回撤比：\t{return_drawdown_ratio:,.2f}")
-
-        statistics = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "total_days": total_days,
-            "profit_days": profit_days,
-            "loss_days": loss_days,
-            "capital": self.capital,
-            "end_balance": end_balance,
-            "max_drawdown": max_drawdown,
-            "max_ddpercent": max_ddpercent,
-            "max_drawdown_duration": max_drawdown_duration,
-            "total_net_pnl": total_net_pnl,
-            "daily_net_pnl": daily_net_pnl,
-            "total_commission": total_commission,
-            "daily_commission": daily_commission,
-            "total_slippage": total_slippage,
-            "daily_slippage": daily_slippage,
-            "total_turnover": total_turnover,
-            "daily_turnover": daily_turnover,
-            "total_trade_count": total_trade_count,
-            "daily_trade_count": daily_trade_count,
-            "total_return": total_return,
-            "annual_return": annual_return,
-            "daily_return": daily_return,
-            "return_std": return_std,
-            "sharpe_ratio": sharpe_ratio,
-            "return_drawdown_ratio": return_drawdown_ratio,
-        }
+            self.output("\n".join([
+                "-" * 30,
+                f"首个交易日：\t{statistics['start_date']}",
+                f"最后交易日：\t{statistics['end_date']}",
+
+                f"总交易日：\t{statistics['total_days']}",
+                f"盈利交易日：\t{statistics['profit_days']}",
+                f"亏损交易日：\t{statistics['loss_days']}",
+
+                f"起始资金：\t{self.capital:,.2f}",
+                f"结束资金：\t{statistics['end_balance']:,.2f}",
+
+                f"总收益率：\t{statistics['total_return']:,.2f}%",
+                f"年化收益：\t{statistics['annual_return']:,.2f}%",
+                f"最大回撤: \t{statistics['max_drawdown']:,.2f}",
+                f"百分比最大回撤: {statistics['max_ddpercent']:,.2f}%",
+                f"最长回撤天数: \t{statistics['max_drawdown_duration']}",
+
+                f"总盈亏：\t{statistics['total_net_pnl']:,.2f}",
+                f"总手续费：\t{statistics['total_commission']:,.2f}",
+                f"总滑点：\t{statistics['total_slippage']:,.2f}",
+                f"总成交金额：\t{statistics['total_turnover']:,.2f}",
+                f"总成交笔数：\t{statistics['total_trade_count']}",
+
+                f"日均盈亏：\t{statistics['daily_net_pnl']:,.2f}",
+                f"日均手续费：\t{statistics['daily_commission']:,.2f}",
+                f"日均滑点：\t{statistics['daily_slippage']:,.2f}",
+                f"日均成交金额：\t{statistics['daily_turnover']:,.2f}",
+                f"日均成交笔数：\t{statistics['daily_trade_count']}",
+
+                f"日均收益率：\t{statistics['daily_return']:,.2f}%",
+                f"收益标准差：\t{statistics['return_std']:,.2f}%",
+                f"Sharpe Ratio：\t{statistics['sharpe_ratio']:,.2f}",
+                f"收益回撤比：\t{statistics['return_drawdown_ratio']:,.2f}",
+            ]))
 
         # Filter potential error infinite value
         for key, value in statistics.items():
@@ -479,19 +724,38 @@ class BacktestingEngine:
         fig.update_layout(height=1000, width=1000)
         fig.show()
 
-    def run_bf_optimization(self, optimization_setting: OptimizationSetting, output=True):
-        """"""
+    def run_bf_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        share_data: bool = False
+    ):
+        """
+        If share_data is True, history data is loaded once here and attached
+        by all worker processes through shared memory.
+        """
         if not check_optimization_setting(optimization_setting):
             return
 
-        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name)
-        results = run_bf_optimization(
-            evaluate_func,
-            optimization_setting,
-            get_target_value,
-            output=self.output,
+        shared_data: dict = None
+        if share_data:
+            shared_data = self.share_history_data()
+
+        evaluate_func: callable = wrap_evaluate(
+            self, optimization_setting.target_name, shared_data
         )
 
+        try:
+            results = run_bf_optimization(
+                evaluate_func,
+                optimization_setting,
+                get_target_value,
+                output=self.output
+            )
+        finally:
+            if shared_data:
+                self.history_data.unshare()
+
         if output:
             for result in results:
                 msg: str = f"参数：{result[0]}, 目标：{result[1]}"
@@ -501,19 +765,38 @@ class BacktestingEngine:
 
     run_optimization = run_bf_optimization
 
-    def run_ga_optimization(self, optimization_setting: OptimizationSetting, output=True):
-        """"""
+    def run_ga_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output=True,
+        share_data: bool = False
+    ):
+        """
+        If share_data is True, history data is loaded once here and attached
+        by all worker processes through shared memory.
+        """
         if not check_optimization_setting(optimization_setting):
             return
 
-        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name)
-        results = run_ga_optimization(
-            evaluate_func,
-            optimization_setting,
-            get_target_value,
-            output=self.output
+        shared_data: dict = None
+        if share_data:
+            shared_data = self.share_history_data()
+
+        evaluate_func: callable = wrap_evaluate(
+            self, optimization_setting.target_name, shared_data
         )
 
+        try:
+            results = run_ga_optimization(
+                evaluate_func,
+                optimization_setting,
+                get_target_value,
+                output=self.output
+            )
+        finally:
+            if shared_data:
+                self.history_data.unshare()
+
         if output:
             for result in results:
                 msg: str = f"参数：{result[0]}, 目标：{result[1]}"
@@ -521,6 +804,23 @@ class BacktestingEngine:
 
         return results
 
+    def share_history_data(self) -> dict:
+        """
+        Publish history data into shared memory, return handle for attaching.
+        """
+        if self.mode == BacktestingMode.TICK:
+            self.output("Tick模式下数据在回放时分段加载，无法共享")
+            return None
+
+        if not self.history_data:
+            self.load_data()
+
+        if not self.history_data:
+            self.output("历史数据为空，无法共享")
+            return None
+
+        return self.history_data.share()
+
     def update_daily_close(self, bars: Dict[str, BarData], dt: datetime) -> None:
         """"""
         d = dt.date()
@@ -534,62 +834,206 @@ class BacktestingEngine:
         if daily_result:
             daily_result.update_close_prices(close_prices)
         else:
+            self.new_daily_result(d, close_prices)
+
+    def update_tick_close(self, tick: TickData) -> None:
+        """
+        Update last price of ticked symbol as its daily close price.
+        """
+        d = tick.datetime.date()
+        daily_result = self.daily_results.get(d, None)
+
+        if daily_result:
+            daily_result.update_close_price(tick.vt_symbol, tick.last_price)
+        else:
+            close_prices = {
+                vt_symbol: t.last_price for vt_symbol, t in self.ticks.items()
+            }
+            self.new_daily_result(d, close_prices)
+
+    def new_daily_result(self, d: date, close_prices: Dict[str, float]) -> None:
+        """
+        Create daily result of new day. In incremental accounting mode, finish
+        pnl of last day and start new day with its end positions and close prices.
+        """
+        if not self.incremental_accounting:
             self.daily_results[d] = PortfolioDailyResult(d, close_prices)
+            return
 
-    def new_bars(self, dt: datetime) -> None:
-        """"""
+        pre_closes = {}
+        start_poses = {}
+
+        if self.daily_results:
+            last_result = next(reversed(self.daily_results.values()))
+            last_result.update_pnl()
+            self.closed_net_pnl += last_result.net_pnl
+
+            pre_closes = last_result.close_prices
+            start_poses = last_result.end_poses
+
+        daily_result = PortfolioDailyResult(d, close_prices)
+        daily_result.init_accounting(
+            pre_closes,
+            start_poses,
+            self.sizes,
+            self.rates,
+            self.slippages
+        )
+        self.daily_results[d] = daily_result
+
+    def get_balance(self) -> float:
+        """
+        Return current balance including floating pnl of the day, only
+        available in incremental accounting mode.
+        """
+        if not self.daily_results:
+            return self.capital
+
+        daily_result = next(reversed(self.daily_results.values()))
+        daily_result.update_pnl()
+        return self.capital + self.closed_net_pnl + daily_result.net_pnl
+
+    def new_bars(self, ix: int) -> None:
+        """
+        Replay bars at row ix of history data.
+        """
+        history_data: PortfolioBarArray = self.history_data
+        dt: datetime = history_data.dts[ix]
         self.datetime = dt
 
         bars: Dict[str, BarData] = {}
-        for vt_symbol in self.vt_symbols:
-            bar = self.history_data.get((dt, vt_symbol), None)
+        valid: list = history_data.valid[ix].tolist()
+        synthetic: list = history_data.synthetic[ix].tolist()
 
+        for col, vt_symbol in enumerate(self.vt_symbols):
             # If bar data of vt_symbol at dt exists
-            if bar:
+            if valid[col]:
+                bar = history_data.get_bar(ix, col)
+
                 # Update bar data for crossing order
                 self.bars[vt_symbol] = bar
 
                 # Put bar into dict for strategy.on_bars update
                 bars[vt_symbol] = bar
-            # Otherwise, use previous close to backfill
-            elif vt_symbol in self.bars:
-                old_bar = self.bars[vt_symbol]
-
-                bar = BarData(
-                    symbol=old_bar.symbol,
-                    exchange=old_bar.exchange,
-                    datetime=dt,
-                    open_price=old_bar.close_price,
-                    high_price=old_bar.close_price,
-                    low_price=old_bar.close_price,
-                    close_price=old_bar.close_price,
-                    gateway_name=old_bar.gateway_name
-                )
+            # Otherwise, use bar backfilled with previous close at load time.
+            # Backfilled prices stay the same until next real bar, so the
+            # previous backfilled bar is copied with datetime updated.
+            elif synthetic[col]:
+                last_bar = self.bars[vt_symbol]
+
+                if is_synthetic(last_bar):
+                    bar = copy(last_bar)
+                    bar.datetime = dt
+                else:
+                    bar = history_data.get_bar(ix, col)
+
                 self.bars[vt_symbol] = bar
 
+        # Daily result must exist before crossing in incremental accounting
+        # mode, so that trades can be added into it immediately.
+        if self.incremental_accounting and self.strategy.inited:
+            self.update_daily_close(self.bars, dt)
+
         self.cross_limit_order()
         self.strategy.on_bars(bars)
 
-        if self.strategy.inited:
+        if self.bar_fanout:
+            self.bar_fanout.update_bars(bars)
+
+        if self.strategy.inited and not self.incremental_accounting:
             self.update_daily_close(self.bars, dt)
 
+    def new_tick(self, tick: TickData) -> None:
+        """"""
+        # Flush bars by replayed time like timer of live engine
+        self.flush_bars(tick.datetime)
+
+        self.datetime = tick.datetime
+        self.tick = tick
+        self.ticks[tick.vt_symbol] = tick
+
+        if self.incremental_accounting and self.strategy.inited:
+            self.update_tick_close(tick)
+
+        self.cross_limit_order()
+        self.strategy.on_tick(tick)
+
+        # Build 1 minute bars from ticks like live engine
+        if self.strategy.shared_bars:
+            if not self.bar_generator:
+                self.bar_generator = PortfolioBarGenerator(self.strategy.on_bars)
+            self.bar_generator.update_tick(tick)
+
+        if self.bar_fanout:
+            self.bar_fanout.update_tick(tick)
+
+        if self.strategy.inited and not self.incremental_accounting:
+            self.update_tick_close(tick)
+
+    def get_cross_prices(self, vt_symbol: str) -> tuple:
+        """
+        Get long cross, short cross, long best and short best price of
+        symbol. Only the symbol of latest tick is crossed in tick mode.
+        """
+        if self.mode == BacktestingMode.BAR:
+            bar = self.bars.get(vt_symbol, None)
+            if not bar:
+                return None
+            return bar.low_price, bar.high_price, bar.open_price, bar.open_price
+        else:
+            tick = self.tick
+            if not tick or tick.vt_symbol != vt_symbol:
+                return None
+            return tick.ask_price_1, tick.bid_price_1, tick.ask_price_1, tick.bid_price_1
+
     def cross_limit_order(self) -> None:
         """
         Cross limit order with last bar/tick data.
         """
-        for order in list(self.active_limit_orders.values()):
-            bar = self.bars[order.vt_symbol]
+        if self.mode == BacktestingMode.BAR:
+            vt_symbols = list(self.order_books.keys())
+        else:
+            vt_symbols = [self.tick.vt_symbol]
+
+        # Find orders crossed by price with order book of each symbol
+        keys: list = []
+
+        for vt_symbol in vt_symbols:
+            book = self.order_books.get(vt_symbol, None)
+            prices = self.get_cross_prices(vt_symbol)
+
+            if book and prices:
+                keys.extend(book.get_crossed_orders(prices[0], prices[1]))
+
+        # New orders need status update even if not crossed. Orders sent
+        # in callbacks below will be processed in next round.
+        submitting_orders = self.submitting_orders
+        self.submitting_orders = {}
+
+        for order in submitting_orders.values():
+            keys.append(get_order_key(order))
 
-            long_cross_price = bar.low_price
-            short_cross_price = bar.high_price
-            long_best_price = bar.open_price
-            short_best_price = bar.open_price
+        # Process orders by sending sequence
+        keys = sorted(set(keys), key=lambda key: key[1])
+
+        for _, _, vt_orderid in keys:
+            # Order may be cancelled in strategy callback
+            order = self.active_limit_orders.get(vt_orderid, None)
+            if not order:
+                continue
+
+            prices = self.get_cross_prices(order.vt_symbol)
 
             # Push order update with status "not traded" (pending).
             if order.status == Status.SUBMITTING:
                 order.status = Status.NOTTRADED
                 self.strategy.update_order(order)
 
+            if not prices:
+                continue
+
+            long_cross_price, short_cross_price, long_best_price, short_best_price = prices
+
             # Check whether limit orders can be filled.
             long_cross = (
                 order.direction == Direction.LONG
@@ -612,6 +1056,7 @@ class BacktestingEngine:
             self.strategy.update_order(order)
 
             self.active_limit_orders.pop(order.vt_orderid)
+            self.order_books[order.vt_symbol].remove_order(order)
 
             # Push trade update
             self.trade_count += 1
@@ -637,6 +1082,9 @@ class BacktestingEngine:
             self.strategy.update_trade(trade)
             self.trades[trade.vt_tradeid] = trade
 
+            if self.incremental_accounting:
+                self.daily_results[self.datetime.date()].update_trade(trade)
+
     def load_bars(
         self,
         strategy: StrategyTemplate,
@@ -679,6 +1127,9 @@ class BacktestingEngine:
         self.active_limit_orders[order.vt_orderid] = order
         self.limit_orders[order.vt_orderid] = order
 
+        self.order_books[vt_symbol].add_order(order)
+        self.submitting_orders[order.vt_orderid] = order
+
         return [order.vt_orderid]
 
     def cancel_order(self, strategy: StrategyTemplate, vt_orderid: str) -> None:
@@ -689,6 +1140,9 @@ class BacktestingEngine:
             return
         order = self.active_limit_orders.pop(vt_orderid)
 
+        self.order_books[order.vt_symbol].remove_order(order)
+        self.submitting_orders.pop(vt_orderid, None)
+
         order.status = Status.CANCELLED
         self.strategy.update_order(order)
 
@@ -717,6 +1171,54 @@ class BacktestingEngine:
         """
         return self.priceticks[vt_symbol]
 
+    def subscribe_window(
+        self,
+        strategy: StrategyTemplate,
+        window: int,
+        interval: Interval,
+        callback: Callable,
+        calendar: TradingCalendar = None
+    ) -> None:
+        """
+        Subscribe window bars aggregated from bars replayed.
+        """
+        if not self.bar_fanout:
+            self.bar_fanout = PortfolioBarFanout(sorted(self.vt_symbols))
+
+        self.bar_fanout.subscribe(callback, window, interval, calendar)
+
+    def register_bar_generator(self, strategy: StrategyTemplate, generator: PortfolioBarGenerator) -> None:
+        """
+        Register bar generator owned by strategy to be flushed by replayed time.
+        """
+        if generator not in self.strategy_generators:
+            self.strategy_generators.append(generator)
+
+    def flush_bars(self, now: datetime) -> None:
+        """
+        Push 1 minute bars not closed by tick before grace passed.
+        """
+        for generator in self.strategy_generators:
+            generator.flush(now, self.bar_flush_grace)
+
+        if self.bar_generator:
+            self.bar_generator.flush(now, self.bar_flush_grace)
+
+        if self.bar_fanout:
+            self.bar_fanout.flush(now, self.bar_flush_grace)
+
+    def get_order(self, strategy: StrategyTemplate, vt_orderid: str) -> OrderData:
+        """
+        Return order data by vt_orderid.
+        """
+        return self.limit_orders.get(vt_orderid, None)
+
+    def get_tick(self, strategy: StrategyTemplate, vt_symbol: str) -> TickData:
+        """
+        Return latest tick data of symbol in tick mode.
+        """
+        return self.ticks.get(vt_symbol, None)
+
     def put_strategy_event(self, strategy: StrategyTemplate) -> None:
         """
         Put an event to update strategy status.
@@ -748,6 +1250,61 @@ class BacktestingEngine:
         return list(self.daily_results.values())
 
 
+def get_order_key(order: OrderData) -> tuple:
+    """
+    Sort key of order in order book: price, sending sequence and vt_orderid.
+    """
+    return (order.price, int(order.orderid), order.vt_orderid)
+
+
+class LimitOrderBook:
+    """
+    Active limit orders of one vt_symbol, sorted by price for each direction.
+    """
+
+    def __init__(self):
+        """"""
+        self.long_orders: List[tuple] = []
+        self.short_orders: List[tuple] = []
+
+    def get_orders(self, direction: Direction) -> List[tuple]:
+        """"""
+        if direction == Direction.LONG:
+            return self.long_orders
+        else:
+            return self.short_orders
+
+    def add_order(self, order: OrderData) -> None:
+        """"""
+        insort(self.get_orders(order.direction), get_order_key(order))
+
+    def remove_order(self, order: OrderData) -> None:
+        """"""
+        orders = self.get_orders(order.direction)
+        key = get_order_key(order)
+
+        ix = bisect_left(orders, key)
+        if ix < len(orders) and orders[ix] == key:
+            del orders[ix]
+
+    def get_crossed_orders(self, long_cross_price: float, short_cross_price: float) -> List[tuple]:
+        """
+        Get keys of long orders priced at or above long cross price, and
+        short orders priced at or below short cross price.
+        """
+        keys: List[tuple] = []
+
+        if long_cross_price > 0 and self.long_orders:
+            ix = bisect_left(self.long_orders, (long_cross_price,))
+            keys.extend(self.long_orders[ix:])
+
+        if short_cross_price > 0 and self.short_orders:
+            ix = bisect_right(self.short_orders, (short_cross_price, float("inf")))
+            keys.extend(self.short_orders[:ix])
+
+        return keys
+
+
 class ContractDailyResult:
     """"""
 
@@ -772,10 +1329,73 @@ class ContractDailyResult:
         self.total_pnl: float = 0
         self.net_pnl: float = 0
 
+        # Used by incremental accounting
+        self.size: float = 1
+        self.rate: float = 0
+        self.slippage_per_unit: float = 0
+        self.trade_value: float = 0
+
     def add_trade(self, trade: TradeData) -> None:
         """"""
         self.trades.append(trade)
 
+    def init_accounting(
+        self,
+        pre_close: float,
+        start_pos: float,
+        size: int,
+        rate: float,
+        slippage: float
+    ) -> None:
+        """
+        Init start position and contract setting for incremental accounting.
+        """
+        if pre_close:
+            self.pre_close = pre_close
+        else:
+            self.pre_close = 1
+
+        self.start_pos = start_pos
+        self.end_pos = start_pos
+
+        self.size = size
+        self.rate = rate
+        self.slippage_per_unit = slippage
+
+    def update_trade(self, trade: TradeData) -> None:
+        """
+        Update position and cost with new trade in incremental accounting.
+        """
+        self.trades.append(trade)
+        self.trade_count += 1
+
+        if trade.direction == Direction.LONG:
+            pos_change = trade.volume
+        else:
+            pos_change = -trade.volume
+
+        self.end_pos += pos_change
+
+        turnover = trade.volume * self.size * trade.price
+
+        self.trade_value += pos_change * trade.price * self.size
+        self.slippage += trade.volume * self.size * self.slippage_per_unit
+        self.turnover += turnover
+        self.commission += turnover * self.rate
+
+    def update_pnl(self) -> None:
+        """
+        Calculate pnl with latest close price in incremental accounting.
+        """
+        self.holding_pnl = self.start_pos * (self.close_price - self.pre_close) * self.size
+
+        # Sum of pos_change * (close_price - trade_price) * size of all trades
+        pos_change = self.end_pos - self.start_pos
+        self.trading_pnl = pos_change * self.close_price * self.size - self.trade_value
+
+        self.total_pnl = self.trading_pnl + self.holding_pnl
+        self.net_pnl = self.total_pnl - self.commission - self.slippage
+
     def calculate_pnl(
         self,
         pre_close: float,
@@ -855,6 +1475,60 @@ class PortfolioDailyResult:
         contract_result = self.contract_results[trade.vt_symbol]
         contract_result.add_trade(trade)
 
+    def init_accounting(
+        self,
+        pre_closes: Dict[str, float],
+        start_poses: Dict[str, float],
+        sizes: Dict[str, float],
+        rates: Dict[str, float],
+        slippages: Dict[str, float],
+    ) -> None:
+        """
+        Init all contract results for incremental accounting.
+        """
+        self.pre_closes = pre_closes
+
+        for vt_symbol, contract_result in self.contract_results.items():
+            contract_result.init_accounting(
+                pre_closes.get(vt_symbol, 0),
+                start_poses.get(vt_symbol, 0),
+                sizes[vt_symbol],
+                rates[vt_symbol],
+                slippages[vt_symbol]
+            )
+
+    def update_trade(self, trade: TradeData) -> None:
+        """"""
+        contract_result = self.contract_results[trade.vt_symbol]
+        contract_result.update_trade(trade)
+
+    def update_pnl(self) -> None:
+        """
+        Sum up pnl of all contract results with latest close prices.
+        """
+        self.trade_count = 0
+        self.turnover = 0
+        self.commission = 0
+        self.slippage = 0
+        self.trading_pnl = 0
+        self.holding_pnl = 0
+        self.total_pnl = 0
+        self.net_pnl = 0
+
+        for vt_symbol, contract_result in self.contract_results.items():
+            contract_result.update_pnl()
+
+            self.trade_count += contract_result.trade_count
+            self.turnover += contract_result.turnover
+            self.commission += contract_result.commission
+            self.slippage += contract_result.slippage
+            self.trading_pnl += contract_result.trading_pnl
+            self.holding_pnl += contract_result.holding_pnl
+            self.total_pnl += contract_result.total_pnl
+            self.net_pnl += contract_result.net_pnl
+
+            self.end_poses[vt_symbol] = contract_result.end_pos
+
     def calculate_pnl(
         self,
         pre_closes: Dict[str, float],
@@ -886,6 +1560,14 @@ class PortfolioDailyResult:
 
             self.end_poses[vt_symbol] = contract_result.end_pos
 
+    def update_close_price(self, vt_symbol: str, close_price: float) -> None:
+        """"""
+        self.close_prices[vt_symbol] = close_price
+
+        contract_result = self.contract_results.get(vt_symbol, None)
+        if contract_result:
+            contract_result.update_close_price(close_price)
+
     def update_close_prices(self, close_prices: Dict[str, float]) -> None:
         """"""
         self.close_prices = close_prices
@@ -901,16 +1583,63 @@ def load_bar_data(
     vt_symbol: str,
     interval: Interval,
     start: datetime,
-    end: datetime
-):
-    """"""
+    end: datetime,
+    use_cache: bool = False
+) -> Tuple[List[datetime], np.ndarray]:
+    """
+    Load bar data as datetime list and value array, from on-disk bar
+    cache if use_cache is True.
+    """
+    if use_cache:
+        return get_bar_cache().load_bar_data(vt_symbol, interval, start, end)
+
     symbol, exchange = extract_vt_symbol(vt_symbol)
 
     database = get_database()
 
-    return database.load_bar_data(
+    data = database.load_bar_data(
         symbol, exchange, interval, start, end
     )
+    return bars_to_array(data)
+
+
+def load_tick_stream(
+    vt_symbols: List[str],
+    start: datetime,
+    end: datetime
+) -> Generator[TickData, None, None]:
+    """
+    Merge tick data of all symbols in time order with a heap. Each symbol
+    loads only one TICK_LOAD_DELTA window from database at a time.
+    """
+    streams = [
+        load_symbol_tick_stream(vt_symbol, start, end) for vt_symbol in vt_symbols
+    ]
+    return merge(*streams, key=get_tick_datetime)
+
+
+def load_symbol_tick_stream(
+    vt_symbol: str,
+    start: datetime,
+    end: datetime
+) -> Generator[TickData, None, None]:
+    """"""
+    symbol, exchange = extract_vt_symbol(vt_symbol)
+    database = get_database()
+
+    while start < end:
+        window_end = min(start + TICK_LOAD_DELTA, end)
+
+        ticks = database.load_tick_data(symbol, exchange, start, window_end)
+        yield from ticks
+
+        # Database query includes both ends of range
+        start = window_end + timedelta(microseconds=1)
+
+
+def get_tick_datetime(tick: TickData) -> datetime:
+    """"""
+    return tick.datetime
 
 
 def evaluate(
@@ -925,6 +1654,11 @@ def evaluate(
     priceticks: Dict[str, float],
     capital: int,
     end: datetime,
+    use_cache: bool,
+    incremental_accounting: bool,
+    mode: BacktestingMode,
+    streaming: bool,
+    shared_data: dict,
     setting: dict
 ):
     """
@@ -942,10 +1676,19 @@ def evaluate(
         priceticks=priceticks,
         capital=capital,
         end=end,
+        use_cache=use_cache,
+        incremental_accounting=incremental_accounting,
+        mode=mode,
+        streaming=streaming
     )
 
     engine.add_strategy(strategy_class, setting)
-    engine.load_data()
+
+    if shared_data:
+        engine.history_data = get_shared_history_data(shared_data)
+    else:
+        engine.load_data()
+
     engine.run_backtesting()
     engine.calculate_result()
     statistics = engine.calculate_statistics(output=False)
@@ -954,7 +1697,25 @@ def evaluate(
     return (str(setting), target_value, statistics)
 
 
-def wrap_evaluate(engine: BacktestingEngine, target_name: str) -> callable:
+def get_shared_history_data(handle: dict) -> PortfolioBarArray:
+    """
+    Attach shared history data once per process and reuse it for later evaluations.
+    """
+    name: str = handle["name"]
+
+    history_data: PortfolioBarArray = shared_history_data.get(name, None)
+    if not history_data:
+        history_data = PortfolioBarArray.attach(handle)
+        shared_history_data[name] = history_data
+
+    return history_data
+
+
+def wrap_evaluate(
+    engine: BacktestingEngine,
+    target_name: str,
+    shared_data: dict = None
+) -> callable:
     """
     Wrap evaluate function with given setting from backtesting engine.
     """
@@ -970,11 +1731,172 @@ def wrap_evaluate(engine: BacktestingEngine, target_name: str) -> callable:
         engine.sizes,
         engine.priceticks,
         engine.capital,
-        engine.end
+        engine.end,
+        engine.use_cache,
+        engine.incremental_accounting,
+        engine.mode,
+        engine.streaming,
+        shared_data
     )
     return func
 
 
+STATISTICS_KEYS: List[str] = [
+    "start_date",
+    "end_date",
+    "total_days",
+    "profit_days",
+    "loss_days",
+    "capital",
+    "end_balance",
+    "max_drawdown",
+    "max_ddpercent",
+    "max_drawdown_duration",
+    "total_net_pnl",
+    "daily_net_pnl",
+    "total_commission",
+    "daily_commission",
+    "total_slippage",
+    "daily_slippage",
+    "total_turnover",
+    "daily_turnover",
+    "total_trade_count",
+    "daily_trade_count",
+    "total_return",
+    "annual_return",
+    "daily_return",
+    "return_std",
+    "sharpe_ratio",
+    "return_drawdown_ratio",
+]
+
+
+def calculate_balance(net_pnl: np.ndarray, capital: float) -> Tuple[np.ndarray, ...]:
+    """
+    Calculate balance, log return, highlevel, drawdown and ddpercent of
+    daily net pnl array shaped (runs, days).
+    """
+    balance = np.cumsum(net_pnl, axis=1) + capital
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.zeros_like(balance)
+        returns[:, 1:] = np.log(balance[:, 1:] / balance[:, :-1])
+        returns[np.isnan(returns)] = 0
+
+        highlevel = np.maximum.accumulate(balance, axis=1)
+        drawdown = balance - highlevel
+        ddpercent = drawdown / highlevel * 100
+
+    return balance, returns, highlevel, drawdown, ddpercent
+
+
+def calculate_statistics_batch(
+    net_pnl: np.ndarray,
+    capital: float,
+    risk_free: float = 0,
+    dates: List[date] = None,
+    commission: np.ndarray = None,
+    slippage: np.ndarray = None,
+    turnover: np.ndarray = None,
+    trade_count: np.ndarray = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Calculate statistics of many backtesting runs in one vectorized call.
+
+    All input arrays are shaped (runs, days) and share the same dates.
+    Every value of the returned dict is an array of length runs.
+    """
+    net_pnl = np.atleast_2d(np.asarray(net_pnl, dtype=np.float64))
+    runs, total_days = net_pnl.shape
+
+    balance, returns, highlevel, drawdown, ddpercent = calculate_balance(net_pnl, capital)
+
+    end_balance = balance[:, -1]
+    max_drawdown = drawdown.min(axis=1)
+    max_ddpercent = np.fmin.reduce(ddpercent, axis=1)
+
+    # Max drawdown starts from the highest balance before it ends
+    max_drawdown_end = drawdown.argmin(axis=1)
+
+    if dates:
+        before_end = np.arange(total_days) <= max_drawdown_end[:, np.newaxis]
+        max_drawdown_start = np.where(before_end, balance, -np.inf).argmax(axis=1)
+
+        days = np.array(dates, dtype="datetime64[D]")
+        max_drawdown_duration = (
+            days[max_drawdown_end] - days[max_drawdown_start]
+        ).astype(np.int64)
+    else:
+        max_drawdown_duration = np.zeros(runs, dtype=np.int64)
+
+    def sum_daily(data: np.ndarray) -> np.ndarray:
+        """"""
+        if data is None:
+            return np.zeros(runs)
+        return np.atleast_2d(np.asarray(data, dtype=np.float64)).sum(axis=1)
+
+    total_net_pnl = net_pnl.sum(axis=1)
+    total_commission = sum_daily(commission)
+    total_slippage = sum_daily(slippage)
+    total_turnover = sum_daily(turnover)
+    total_trade_count = sum_daily(trade_count).astype(np.int64)
+
+    total_return = (end_balance / capital - 1) * 100
+    annual_return = total_return / total_days * 240
+    daily_return = returns.mean(axis=1) * 100
+
+    if total_days > 1:
+        return_std = returns.std(axis=1, ddof=1) * 100
+    else:
+        return_std = np.zeros(runs)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily_risk_free = risk_free / np.sqrt(240)
+        sharpe_ratio = np.where(
+            return_std != 0,
+            (daily_return - daily_risk_free) / return_std * np.sqrt(240),
+            0
+        )
+
+        return_drawdown_ratio = -total_net_pnl / max_drawdown
+
+    statistics = {
+        "start_date": np.full(runs, dates[0] if dates else "", dtype=object),
+        "end_date": np.full(runs, dates[-1] if dates else "", dtype=object),
+        "total_days": np.full(runs, total_days),
+        "profit_days": (net_pnl > 0).sum(axis=1),
+        "loss_days": (net_pnl < 0).sum(axis=1),
+        "capital": np.full(runs, capital),
+        "end_balance": end_balance,
+        "max_drawdown": max_drawdown,
+        "max_ddpercent": max_ddpercent,
+        "max_drawdown_duration": max_drawdown_duration,
+        "total_net_pnl": total_net_pnl,
+        "daily_net_pnl": total_net_pnl / total_days,
+        "total_commission": total_commission,
+        "daily_commission": total_commission / total_days,
+        "total_slippage": total_slippage,
+        "daily_slippage": total_slippage / total_days,
+        "total_turnover": total_turnover,
+        "daily_turnover": total_turnover / total_days,
+        "total_trade_count": total_trade_count,
+        "daily_trade_count": total_trade_count / total_days,
+        "total_return": total_return,
+        "annual_return": annual_return,
+        "daily_return": daily_return,
+        "return_std": return_std,
+        "sharpe_ratio": sharpe_ratio,
+        "return_drawdown_ratio": return_drawdown_ratio,
+    }
+
+    # Filter potential error infinite and nan value
+    for key, value in statistics.items():
+        if value.dtype != object:
+            statistics[key] = np.nan_to_num(value, nan=0, posinf=0, neginf=0)
+
+    return statistics
+
+
 def get_target_value(result: list) -> float:
     """
     Get target value for sorting optimization results.
@@ -2,8 +2,11 @@
 Defines constants and objects used in PortfolioStrategy App.
 """
 
+from datetime import timedelta
 from enum import Enum
 
+from vnpy.trader.constant import Interval
+
 
 APP_NAME = "PortfolioStrategy"
 
@@ -13,5 +16,18 @@ class EngineType(Enum):
     BACKTESTING = "回测"
 
 
+class BacktestingMode(Enum):
+    BAR = 1
+    TICK = 2
+
+
 EVENT_PORTFOLIO_LOG = "ePortfolioLog"
 EVENT_PORTFOLIO_STRATEGY = "ePortfolioStrategy"
+EVENT_PORTFOLIO_TICK = "ePortfolioTick"
+
+
+INTERVAL_DELTA_MAP = {
+    Interval.MINUTE: timedelta(minutes=1),
+    Interval.HOUR: timedelta(hours=1),
+    Interval.DAILY: timedelta(days=1),
+}
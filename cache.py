@@ -0,0 +1,341 @@
+"""
+Persistent on-disk bar data cache for backtesting.
+"""
+
+import json
+import sys
+from threading import Lock
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from vnpy.trader.constant import Interval
+from vnpy.trader.database import BaseDatabase, DB_TZ, get_database
+from vnpy.trader.utility import extract_vt_symbol, get_folder_path
+
+from .utility import BAR_FIELDS, bars_to_array, to_timestamp, from_timestamp
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Exclusive lock on a file shared by all processes using the cache.
+    """
+
+    def __init__(self, path: Path):
+        """"""
+        self.path: Path = path
+        self.file = None
+
+    def __enter__(self) -> "FileLock":
+        """"""
+        self.file = open(self.path, mode="a+b")
+
+        if sys.platform == "win32":
+            self.file.seek(0)
+
+            # LK_LOCK gives up after 10 seconds, keep waiting
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, *args) -> None:
+        """"""
+        if sys.platform == "win32":
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+        self.file.close()
+        self.file = None
+
+
+class CacheEntry:
+    """
+    Cached bar arrays of one vt_symbol and interval.
+
+    Timestamps and bar values are stored as .npy files, which are memory
+    mapped on load. Each update writes a new version of the files so that
+    arrays still mapped by readers are never overwritten. Entry is reloaded
+    and updated under a file lock, as optimization workers in other
+    processes may share the same cache folder.
+    """
+
+    def __init__(self, path: Path):
+        """"""
+        self.path: Path = path
+        self.lock: Lock = Lock()
+        self.file_lock: FileLock = FileLock(path.joinpath("lock"))
+        self.version: int = 0
+        self.naive: bool = False
+
+        # Sorted and merged [start, end] timestamp ranges already queried
+        self.ranges: List[List[int]] = []
+
+        self.timestamps: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.values: np.ndarray = np.zeros((0, len(BAR_FIELDS)), dtype=np.float64)
+
+    def load(self) -> None:
+        """
+        Load latest version of data if updated by another process.
+        """
+        meta_path: Path = self.path.joinpath("meta.json")
+        if not meta_path.exists():
+            return
+
+        with open(meta_path, mode="r", encoding="UTF-8") as f:
+            meta: dict = json.load(f)
+
+        if meta["version"] == self.version:
+            return
+
+        self.version = meta["version"]
+        self.naive = meta["naive"]
+        self.ranges = meta["ranges"]
+
+        self.timestamps = np.load(self.get_file_path("dt"), mmap_mode="r")
+        self.values = np.load(self.get_file_path("bar"), mmap_mode="r")
+
+    def save(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """
+        Write data of a new version and switch meta file to it.
+        """
+        old_version: int = self.version
+        self.version += 1
+
+        np.save(self.get_file_path("dt"), timestamps)
+        np.save(self.get_file_path("bar"), values)
+
+        meta: dict = {
+            "version": self.version,
+            "naive": self.naive,
+            "ranges": self.ranges
+        }
+
+        meta_path: Path = self.path.joinpath("meta.json")
+        temp_path: Path = self.path.joinpath("meta.json.tmp")
+
+        with open(temp_path, mode="w", encoding="UTF-8") as f:
+            json.dump(meta, f)
+        temp_path.replace(meta_path)
+
+        self.timestamps = np.load(self.get_file_path("dt"), mmap_mode="r")
+        self.values = np.load(self.get_file_path("bar"), mmap_mode="r")
+
+        # Old files may still be mapped by other readers
+        for suffix in ["dt", "bar"]:
+            try:
+                self.get_file_path(suffix, old_version).unlink()
+            except OSError:
+                pass
+
+    def get_file_path(self, suffix: str, version: int = None) -> Path:
+        """"""
+        if version is None:
+            version = self.version
+        return self.path.joinpath(f"{version}.{suffix}.npy")
+
+    def get_gaps(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Get timestamp ranges within [start, end] not covered by cache.
+        """
+        gaps: List[Tuple[int, int]] = []
+
+        for range_start, range_end in self.ranges:
+            if range_end < start:
+                continue
+            if range_start > end:
+                break
+
+            if range_start > start:
+                gaps.append((start, range_start))
+            start = max(start, range_end)
+
+        if start < end:
+            gaps.append((start, end))
+
+        return gaps
+
+    def update(
+        self,
+        covered: List[Tuple[int, int]],
+        timestamps: np.ndarray,
+        values: np.ndarray
+    ) -> None:
+        """
+        Merge newly queried data and ranges into cache.
+        """
+        if len(timestamps):
+            all_timestamps: np.ndarray = np.concatenate([self.timestamps, timestamps])
+            all_values: np.ndarray = np.concatenate([self.values, values])
+
+            # Keep the last value of duplicated timestamps
+            ix: np.ndarray = np.argsort(all_timestamps, kind="stable")[::-1]
+            all_timestamps, unique_ix = np.unique(all_timestamps[ix], return_index=True)
+            all_values = all_values[ix][unique_ix]
+        else:
+            all_timestamps = np.asarray(self.timestamps)
+            all_values = np.asarray(self.values)
+
+        ranges: List[List[int]] = sorted(self.ranges + [list(r) for r in covered])
+        merged: List[List[int]] = []
+
+        for range_start, range_end in ranges:
+            if merged and range_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+
+        self.ranges = merged
+        self.save(all_timestamps, all_values)
+
+    def get_data(self, start: int, end: int) -> Tuple[List[datetime], np.ndarray]:
+        """
+        Get cached data within [start, end] as datetime list and value array.
+        """
+        left: int = np.searchsorted(self.timestamps, start, side="left")
+        right: int = np.searchsorted(self.timestamps, end, side="right")
+
+        dts: List[datetime] = [
+            from_timestamp(ts, self.naive) for ts in self.timestamps[left:right].tolist()
+        ]
+        return dts, self.values[left:right]
+
+
+class BarCache:
+    """
+    Bar data cache keyed by vt_symbol and interval, missing date ranges
+    are loaded from database and saved into cache.
+    """
+
+    def __init__(self, folder_name: str = "portfolio_bar_cache"):
+        """"""
+        self.path: Path = get_folder_path(folder_name)
+        self.entries: Dict[Tuple[str, Interval], CacheEntry] = {}
+        self.database: BaseDatabase = None
+        self.lock: Lock = Lock()
+
+    def get_entry(self, vt_symbol: str, interval: Interval) -> CacheEntry:
+        """"""
+        key: tuple = (vt_symbol, interval)
+
+        with self.lock:
+            entry: CacheEntry = self.entries.get(key, None)
+            if not entry:
+                path: Path = self.path.joinpath(f"{vt_symbol}_{interval.value}")
+                path.mkdir(exist_ok=True)
+
+                entry = CacheEntry(path)
+                self.entries[key] = entry
+
+        return entry
+
+    def load_bar_data(
+        self,
+        vt_symbol: str,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> Tuple[List[datetime], np.ndarray]:
+        """
+        Load bar data within [start, end], only gaps missing in cache are
+        queried from database.
+        """
+        entry: CacheEntry = self.get_entry(vt_symbol, interval)
+
+        start_ts: int = to_timestamp(start)
+        end_ts: int = to_timestamp(end)
+
+        # Requests of the same entry from multiple threads and processes
+        # are serialized
+        with entry.lock, entry.file_lock:
+            entry.load()
+
+            gaps: List[Tuple[int, int]] = entry.get_gaps(start_ts, end_ts)
+            if gaps:
+                self.load_gaps(entry, vt_symbol, interval, gaps)
+
+            return entry.get_data(start_ts, end_ts)
+
+    def load_gaps(
+        self,
+        entry: CacheEntry,
+        vt_symbol: str,
+        interval: Interval,
+        gaps: List[Tuple[int, int]]
+    ) -> None:
+        """"""
+        if not self.database:
+            self.database = get_database()
+
+        symbol, exchange = extract_vt_symbol(vt_symbol)
+
+        # Data after now may be inserted into database later, never cache it
+        now_ts: int = to_timestamp(datetime.now(DB_TZ))
+
+        covered: List[Tuple[int, int]] = []
+        timestamps: List[int] = []
+        values: List[np.ndarray] = []
+
+        for gap_start, gap_end in gaps:
+            bars: list = self.database.load_bar_data(
+                symbol,
+                exchange,
+                interval,
+                from_timestamp(gap_start, True),
+                from_timestamp(gap_end, True)
+            )
+
+            if bars:
+                entry.naive = bars[0].datetime.tzinfo is None
+
+            dts, gap_values = bars_to_array(bars)
+            timestamps.extend(to_timestamp(dt) for dt in dts)
+            values.append(gap_values)
+
+            if gap_start < now_ts:
+                covered.append((gap_start, min(gap_end, now_ts)))
+
+        entry.update(
+            covered,
+            np.array(timestamps, dtype=np.int64),
+            np.concatenate(values)
+        )
+
+    def clear(self) -> None:
+        """
+        Remove all cached data files.
+        """
+        self.entries.clear()
+
+        for path in self.path.glob("*/*"):
+            path.unlink()
+        for path in self.path.iterdir():
+            path.rmdir()
+
+
+bar_cache: BarCache = None
+bar_cache_lock: Lock = Lock()
+
+
+def get_bar_cache() -> BarCache:
+    """"""
+    global bar_cache
+    with bar_cache_lock:
+        if not bar_cache:
+            bar_cache = BarCache()
+    return bar_cache
@@ -2,12 +2,19 @@
 
 import importlib
 import glob
+import json
+import os
 import traceback
-from collections import defaultdict
+from copy import deepcopy
+from bisect import bisect_left
+from collections import defaultdict, deque
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Type, Any, Callable
-from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, RLock, Condition, current_thread
+from time import time
+from typing import Deque, Dict, List, Set, Tuple, Type, Any, Callable
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, Future
 from tzlocal import get_localzone
 
 from vnpy.event import Event, EventEngine
@@ -28,7 +35,8 @@ from vnpy.trader.event import (
     EVENT_TICK,
     EVENT_ORDER,
     EVENT_TRADE,
-    EVENT_POSITION
+    EVENT_POSITION,
+    EVENT_TIMER
 )
 from vnpy.trader.constant import (
     Direction,
@@ -37,7 +45,7 @@ from vnpy.trader.constant import (
     Exchange,
     Offset
 )
-from vnpy.trader.utility import load_json, save_json, extract_vt_symbol, round_to
+from vnpy.trader.utility import load_json, extract_vt_symbol, round_to, get_file_path
 from vnpy.trader.datafeed import BaseDatafeed, get_datafeed
 from vnpy.trader.converter import OffsetConverter
 from vnpy.trader.database import BaseDatabase, get_database
@@ -45,9 +53,17 @@ from vnpy.trader.database import BaseDatabase, get_database
 from .base import (
     APP_NAME,
     EVENT_PORTFOLIO_LOG,
-    EVENT_PORTFOLIO_STRATEGY
+    EVENT_PORTFOLIO_STRATEGY,
+    EVENT_PORTFOLIO_TICK,
+    INTERVAL_DELTA_MAP
 )
 from .template import StrategyTemplate
+from .utility import (
+    PortfolioBarArray,
+    PortfolioBarFanout,
+    PortfolioBarGenerator,
+    TradingCalendar
+)
 
 
 class StrategyEngine(BaseEngine):
@@ -56,21 +72,97 @@ class StrategyEngine(BaseEngine):
     setting_filename = "portfolio_strategy_setting.json"
     data_filename = "portfolio_strategy_data.json"
 
+    worker_queue_size = 10000
+    tradeid_window = 100000
+    order_retention = 60
+    order_archive_size = 100000
+    init_workers = 1
+    fetch_workers = 8
+    session_roll_hour = 17
+
+    # Minimum seconds between writes of the same file, strategy data is
+    # also appended into journal before written if data_journal is on.
+    write_interval = 0
+    data_journal = False
+
+    # Max count of strategy variables update event per second
+    strategy_event_rate = 2
+
+    # Seconds after minute end to push 1 minute bars built from ticks on
+    # timer, if no tick of the next minute arrived.
+    bar_flush_grace = 2
+
     def __init__(self, main_engine: MainEngine, event_engine: EventEngine):
         """"""
         super().__init__(main_engine, event_engine, APP_NAME)
 
         self.strategy_data: Dict[str, Dict] = {}
 
+        # Setting and data files are written in background
+        self.json_writer: JsonWriter = JsonWriter(self.write_log, self.write_interval)
+        self.json_writer.start()
+
+        # Variables text last sent by strategy event, changed from worker,
+        # timer and UI threads under event lock
+        self.event_lock: RLock = RLock()
+        self.event_times: Dict[str, float] = {}
+        self.event_texts: Dict[str, Dict[str, str]] = {}
+        self.event_pending: Set[str] = set()
+
         self.classes: Dict[str, Type[StrategyTemplate]] = {}
         self.strategies: Dict[str, StrategyTemplate] = {}
 
         self.symbol_strategy_map: Dict[str, List[StrategyTemplate]] = defaultdict(list)
+
+        # Tick handlers and inited strategies for each vt_symbol, rebuilt
+        # only when strategy inited status changes.
+        self.tick_dispatch_map: Dict[str, Tuple[List[Callable], List[StrategyTemplate]]] = {}
+        self.dispatch_lock: Lock = Lock()
+        self.tick_conflators: Dict[str, "TickConflator"] = {}
+
+        # 1 minute bars built from ticks once for all strategies and fanouts
+        self.bar_generator: PortfolioBarGenerator = PortfolioBarGenerator(self.process_minute_bars)
+        self.bar_strategies: List[StrategyTemplate] = []
+
+        # Window bars shared by strategies of the same vt_symbols
+        self.bar_fanouts: Dict[Tuple[str, ...], PortfolioBarFanout] = {}
+        self.strategy_subscriptions: Dict[str, List[tuple]] = defaultdict(list)
+
+        # Bar generators owned by strategies, flushed by timer
+        self.strategy_generators: Dict[str, List[PortfolioBarGenerator]] = defaultdict(list)
+
+        # Strategies running callbacks in their own worker threads
+        self.workers: Dict[str, "StrategyWorker"] = {}
+        self.strategy_worker_map: Dict[str, "StrategyWorker"] = {}
+
+        # Order sending from worker threads and order/trade update from
+        # event thread are serialized with this lock.
+        self.order_lock: Lock = Lock()
+
         self.orderid_strategy_map: Dict[str, StrategyTemplate] = {}
 
-        self.init_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
+        # Finished orders are retired from orderid strategy map and strategy
+        # orders after retention seconds, and then found from main engine.
+        # Strategy name of recent retired orders is kept in a bounded archive.
+        self.finished_orders: Deque[Tuple[datetime, str]] = deque()
+        self.retired_orders: Dict[str, str] = {}
+
+        # Strategies are inited concurrently by init workers, while history
+        # data is fetched concurrently by fetch workers.
+        self.init_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.init_workers)
+        self.fetch_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.fetch_workers)
+
+        # History data requests shared by strategies during init
+        self.init_lock: Lock = Lock()
+        self.init_pending: Set[str] = set()
+        self.history_futures: Dict[Tuple[str, int, Interval], Future] = {}
+
+        # History bars of the longest range loaded in current session
+        self.history_lock: Lock = Lock()
+        self.history_session: date = None
+        self.history_cache: Dict[Tuple[str, Interval], "BarHistory"] = {}
 
-        self.vt_tradeids: Set[str] = set()
+        self.vt_tradeids: "TradeIdFilter" = TradeIdFilter(self.tradeid_window)
 
         self.offset_converter: OffsetConverter = OffsetConverter(self.main_engine)
 
@@ -91,12 +183,19 @@ class StrategyEngine(BaseEngine):
         """"""
         self.stop_all_strategies()
 
+        for worker in self.workers.values():
+            worker.stop()
+
+        self.json_writer.stop()
+
     def register_event(self):
         """"""
         self.event_engine.register(EVENT_TICK, self.process_tick_event)
         self.event_engine.register(EVENT_ORDER, self.process_order_event)
         self.event_engine.register(EVENT_TRADE, self.process_trade_event)
         self.event_engine.register(EVENT_POSITION, self.process_position_event)
+        self.event_engine.register(EVENT_PORTFOLIO_TICK, self.process_conflated_tick_event)
+        self.event_engine.register(EVENT_TIMER, self.process_timer_event)
 
         # New added for porfoliostrategy log to log file
         log_engine = self.main_engine.get_engine("log")
@@ -130,48 +229,326 @@ class StrategyEngine(BaseEngine):
         """"""
         tick: TickData = event.data
 
-        strategies = self.symbol_strategy_map[tick.vt_symbol]
-        if not strategies:
+        dispatch = self.tick_dispatch_map.get(tick.vt_symbol, None)
+        if not dispatch:
+            return
+        on_ticks, strategies = dispatch
+
+        # One exception boundary for all strategies, after an exception the
+        # rest strategies are still called.
+        start = 0
+        count = len(on_ticks)
+
+        while start < count:
+            ix = start
+            try:
+                for ix in range(start, count):
+                    on_ticks[ix](tick)
+                return
+            except Exception:
+                strategy = strategies[ix]
+                if strategy:
+                    self.process_strategy_exception(strategy)
+                else:
+                    self.write_log(f"K线合成触发异常\n{traceback.format_exc()}")
+                start = ix + 1
+
+    def update_tick_dispatch(self):
+        """
+        Rebuild tick dispatch map with strategies already inited.
+        """
+        with self.dispatch_lock:
+            tick_dispatch_map = {}
+            bar_strategies = []
+            bar_symbols = set()
+
+            for vt_symbol, strategies in self.symbol_strategy_map.items():
+                on_ticks = []
+                inited_strategies = []
+
+                for strategy in strategies:
+                    if not strategy.inited:
+                        continue
+
+                    worker = self.strategy_worker_map.get(strategy.strategy_name, None)
+
+                    if strategy.tick_conflation:
+                        conflator = self.get_tick_conflator(strategy)
+                        on_ticks.append(conflator.put_tick)
+                    elif worker:
+                        on_ticks.append(partial(worker.put_tick, strategy))
+                    else:
+                        on_ticks.append(strategy.on_tick)
+
+                    inited_strategies.append(strategy)
+
+                    if strategy.shared_bars:
+                        bar_symbols.add(vt_symbol)
+                        if strategy not in bar_strategies:
+                            bar_strategies.append(strategy)
+
+                if on_ticks:
+                    tick_dispatch_map[vt_symbol] = (on_ticks, inited_strategies)
+
+            for fanout in self.bar_fanouts.values():
+                bar_symbols.update(fanout.vt_symbols)
+
+            # Shared bar generator is updated after strategies
+            for vt_symbol in bar_symbols:
+                on_ticks, inited_strategies = tick_dispatch_map.setdefault(vt_symbol, ([], []))
+                on_ticks.append(self.bar_generator.update_tick)
+                inited_strategies.append(None)
+
+            self.bar_strategies = bar_strategies
+            self.tick_dispatch_map = tick_dispatch_map
+
+    def process_minute_bars(self, bars: Dict[str, BarData]):
+        """
+        Push 1 minute bars built from ticks to strategies and fanouts.
+        """
+        for strategy in self.bar_strategies:
+            strategy_bars = {
+                vt_symbol: bars[vt_symbol]
+                for vt_symbol in strategy.vt_symbols if vt_symbol in bars
+            }
+            if strategy_bars:
+                self.push_strategy_bars(strategy, strategy.on_bars, strategy_bars)
+
+        for fanout in list(self.bar_fanouts.values()):
+            fanout_bars = {
+                vt_symbol: bars[vt_symbol]
+                for vt_symbol in fanout.vt_symbols if vt_symbol in bars
+            }
+            if fanout_bars:
+                fanout.update_bars(fanout_bars)
+
+    def get_tick_conflator(self, strategy: StrategyTemplate) -> "TickConflator":
+        """"""
+        conflator = self.tick_conflators.get(strategy.strategy_name, None)
+
+        if not conflator or conflator.strategy is not strategy:
+            conflator = TickConflator(strategy, self.schedule_conflated_ticks)
+            self.tick_conflators[strategy.strategy_name] = conflator
+
+        return conflator
+
+    def schedule_conflated_ticks(self, conflator: "TickConflator"):
+        """
+        Schedule delivery of conflator, in worker thread of the strategy if
+        exists so that ticks keep conflating while the worker is busy.
+        """
+        worker = self.strategy_worker_map.get(conflator.strategy.strategy_name, None)
+
+        if worker:
+            worker.put_conflator(conflator)
+        else:
+            self.event_engine.put(Event(EVENT_PORTFOLIO_TICK, conflator))
+
+    def process_conflated_tick_event(self, event: Event):
+        """"""
+        conflator: TickConflator = event.data
+        self.deliver_conflated_ticks(conflator)
+
+    def deliver_conflated_ticks(self, conflator: "TickConflator"):
+        """
+        Deliver latest ticks pending in conflator to strategy.
+        """
+        strategy = conflator.strategy
+
+        ticks = conflator.pop_ticks()
+
+        if self.strategies.get(strategy.strategy_name, None) is not strategy:
             return
 
-        for strategy in strategies:
-            if strategy.inited:
-                self.call_strategy_func(strategy, strategy.on_tick, tick)
+        for tick in ticks:
+            if not strategy.inited:
+                continue
+
+            self.call_strategy_func(strategy, strategy.on_tick, tick)
+
+    def get_tick_conflation_stats(self, strategy_name: str) -> Dict[str, int]:
+        """
+        Get tick count received, delivered, dropped and coalesced of a
+        strategy in tick conflation mode.
+        """
+        conflator = self.tick_conflators.get(strategy_name, None)
+        if not conflator:
+            return {}
+
+        return conflator.get_stats()
+
+    def get_worker(self, worker_name: str) -> "StrategyWorker":
+        """"""
+        worker = self.workers.get(worker_name, None)
+
+        if not worker:
+            worker = StrategyWorker(worker_name, self, self.worker_queue_size)
+            worker.start()
+            self.workers[worker_name] = worker
+
+        return worker
+
+    def dispatch_strategy_func(
+        self, strategy: StrategyTemplate, func: Callable, params: Any = None
+    ):
+        """
+        Call function of a strategy in its worker thread if exists,
+        otherwise call it directly.
+        """
+        worker = self.strategy_worker_map.get(strategy.strategy_name, None)
+
+        if worker:
+            worker.put(strategy, func, params)
+        else:
+            self.call_strategy_func(strategy, func, params)
+
+    def run_strategy_func(
+        self, strategy: StrategyTemplate, func: Callable, params: Any = None
+    ):
+        """
+        Call function of a strategy in its worker thread if exists, and
+        wait until it is finished.
+        """
+        worker = self.strategy_worker_map.get(strategy.strategy_name, None)
+
+        if worker:
+            worker.call(strategy, func, params)
+        else:
+            self.call_strategy_func(strategy, func, params)
+
+    def get_queue_depths(self) -> Dict[str, int]:
+        """
+        Get inbound queue depth of worker thread for each strategy.
+        """
+        return {
+            strategy_name: worker.get_depth()
+            for strategy_name, worker in self.strategy_worker_map.items()
+        }
+
+    def get_tradeid_count(self) -> int:
+        """
+        Get count of vt_tradeids stored for duplicate trade filter.
+        """
+        return len(self.vt_tradeids)
+
+    def process_timer_event(self, event: Event):
+        """
+        Put strategy event throttled since last timer, flush 1 minute bars
+        not closed by tick, and retire finished orders expired.
+        """
+        self.bar_generator.flush(grace=self.bar_flush_grace)
+
+        # Generators owned by strategy are flushed in its worker thread
+        for strategy_name, generators in list(self.strategy_generators.items()):
+            strategy = self.strategies.get(strategy_name, None)
+            if not strategy or not strategy.inited:
+                continue
+
+            for generator in generators:
+                self.dispatch_strategy_func(
+                    strategy, partial(generator.flush, None, self.bar_flush_grace)
+                )
+
+        with self.order_lock:
+            self.retire_orders(datetime.now())
+
+        with self.event_lock:
+            for strategy_name in list(self.event_pending):
+                strategy = self.strategies.get(strategy_name, None)
+
+                if strategy:
+                    self.put_strategy_update_event(strategy, time())
+                else:
+                    self.event_pending.discard(strategy_name)
 
     def process_order_event(self, event: Event):
         """"""
         order: OrderData = event.data
 
-        self.offset_converter.update_order(order)
+        with self.order_lock:
+            self.offset_converter.update_order(order)
+
+            strategy = self.orderid_strategy_map.get(order.vt_orderid, None)
+
+            if strategy and not order.is_active():
+                self.finish_order(order.vt_orderid)
 
-        strategy = self.orderid_strategy_map.get(order.vt_orderid, None)
         if not strategy:
             return
 
-        self.call_strategy_func(strategy, strategy.update_order, order)
+        self.dispatch_strategy_func(strategy, strategy.update_order, order)
 
     def process_trade_event(self, event: Event):
         """"""
         trade: TradeData = event.data
 
-        # Filter duplicate trade push
-        if trade.vt_tradeid in self.vt_tradeids:
-            return
-        self.vt_tradeids.add(trade.vt_tradeid)
+        with self.order_lock:
+            # Filter duplicate trade push before updating offset converter,
+            # trades not sent by strategies are also checked.
+            if trade.vt_tradeid in self.vt_tradeids:
+                return
+            self.vt_tradeids.add(trade.vt_tradeid)
+
+            self.offset_converter.update_trade(trade)
 
-        self.offset_converter.update_trade(trade)
+            strategy = self.get_order_strategy(trade.vt_orderid)
 
-        strategy = self.orderid_strategy_map.get(trade.vt_orderid, None)
         if not strategy:
             return
 
-        self.call_strategy_func(strategy, strategy.update_trade, trade)
+        self.dispatch_strategy_func(strategy, strategy.update_trade, trade)
+
+    def finish_order(self, vt_orderid: str):
+        """
+        Schedule retirement of finished order and retire expired ones.
+        """
+        now = datetime.now()
+
+        self.retire_orders(now)
+
+        self.finished_orders.append((now + timedelta(seconds=self.order_retention), vt_orderid))
+
+    def retire_orders(self, now: datetime):
+        """
+        Retire finished orders expired, also called on timer.
+        """
+        while self.finished_orders and self.finished_orders[0][0] <= now:
+            _, vt_orderid = self.finished_orders.popleft()
+
+            strategy = self.orderid_strategy_map.pop(vt_orderid, None)
+            if not strategy:
+                continue
+
+            # Strategy orders are only changed in its worker thread
+            self.dispatch_strategy_func(
+                strategy, partial(strategy.orders.pop, vt_orderid, None)
+            )
+
+            self.retired_orders[vt_orderid] = strategy.strategy_name
+
+            if len(self.retired_orders) > self.order_archive_size:
+                self.retired_orders.pop(next(iter(self.retired_orders)))
+
+    def get_order_strategy(self, vt_orderid: str) -> StrategyTemplate:
+        """
+        Get strategy of order, including orders already retired.
+        """
+        strategy = self.orderid_strategy_map.get(vt_orderid, None)
+        if strategy:
+            return strategy
+
+        strategy_name = self.retired_orders.get(vt_orderid, None)
+        if strategy_name:
+            return self.strategies.get(strategy_name, None)
+
+        return None
 
     def process_position_event(self, event: Event):
         """"""
         position: PositionData = event.data
 
-        self.offset_converter.update_position(position)
+        with self.order_lock:
+            self.offset_converter.update_position(position)
 
     def send_order(
         self,
@@ -208,28 +585,31 @@ class StrategyEngine(BaseEngine):
             reference=f"{APP_NAME}_{strategy.strategy_name}"
         )
 
-        # Convert with offset converter
-        req_list = self.offset_converter.convert_order_request(original_req, lock, net)
+        # Order update of new orders is processed after the relationship
+        # between orderid and strategy saved.
+        with self.order_lock:
+            # Convert with offset converter
+            req_list = self.offset_converter.convert_order_request(original_req, lock, net)
 
-        # Send Orders
-        vt_orderids = []
+            # Send Orders
+            vt_orderids = []
 
-        for req in req_list:
-            req.reference = strategy.strategy_name      # Add strategy name as order reference
+            for req in req_list:
+                req.reference = strategy.strategy_name      # Add strategy name as order reference
 
-            vt_orderid = self.main_engine.send_order(
-                req, contract.gateway_name)
+                vt_orderid = self.main_engine.send_order(
+                    req, contract.gateway_name)
 
-            # Check if sending order successful
-            if not vt_orderid:
-                continue
+                # Check if sending order successful
+                if not vt_orderid:
+                    continue
 
-            vt_orderids.append(vt_orderid)
+                vt_orderids.append(vt_orderid)
 
-            self.offset_converter.update_order_request(req, vt_orderid)
+                self.offset_converter.update_order_request(req, vt_orderid)
 
-            # Save relationship between orderid and strategy.
-            self.orderid_strategy_map[vt_orderid] = strategy
+                # Save relationship between orderid and strategy.
+                self.orderid_strategy_map[vt_orderid] = strategy
 
         return vt_orderids
 
@@ -244,6 +624,12 @@ class StrategyEngine(BaseEngine):
         req = order.create_cancel_request()
         self.main_engine.cancel_order(req, order.gateway_name)
 
+    def get_order(self, strategy: StrategyTemplate, vt_orderid: str) -> OrderData:
+        """
+        Get order data from main engine.
+        """
+        return self.main_engine.get_order(vt_orderid)
+
     def get_tick(self, strategy: StrategyTemplate, vt_symbol: str):
         tick = self.main_engine.get_tick(vt_symbol)
 
@@ -266,53 +652,199 @@ class StrategyEngine(BaseEngine):
     def load_bars(self, strategy: StrategyTemplate, days: int, interval: Interval):
         """"""
         vt_symbols = strategy.vt_symbols
-        dts: Set[datetime] = set()
-        history_data: Dict[Tuple, BarData] = {}
+        history: Dict[str, List[BarData]] = {}
 
-        # Load data from rqdata/gateway/database
-        for vt_symbol in vt_symbols:
-            data = self.load_bar(vt_symbol, days, interval)
+        # Load data from rqdata/gateway/database concurrently
+        futures = [
+            self.get_history_future(vt_symbol, days, interval)
+            for vt_symbol in vt_symbols
+        ]
+
+        for vt_symbol, future in zip(vt_symbols, futures):
+            history[vt_symbol] = future.result()
+
+        # Align data and backfill missing bars with previous close
+        history_data = PortfolioBarArray.from_bars(vt_symbols, history, interval)
 
-            for bar in data:
-                dts.add(bar.datetime)
-                history_data[(bar.datetime, vt_symbol)] = bar
+        # Push the whole window to strategy in columnar warmup, and window
+        # bars subscribed are warmed up from the same array.
+        if strategy.columnar_warmup:
+            if len(history_data):
+                self.run_strategy_func(strategy, strategy.on_history, history_data)
 
-        # Convert data structure and push to strategy
-        dts = list(dts)
-        dts.sort()
+                warmup_fanout = self.create_warmup_fanout(strategy)
+                if warmup_fanout:
+                    warmup_fanout.update_history(history_data)
+            return
+
+        # Window bars subscribed are warmed up by a fanout of the strategy
+        warmup_fanout = self.create_warmup_fanout(strategy)
 
+        # Push to strategy
         bars = {}
 
-        for dt in dts:
-            for vt_symbol in vt_symbols:
-                bar = history_data.get((dt, vt_symbol), None)
-
-                # If bar data of vt_symbol at dt exists
-                if bar:
-                    bars[vt_symbol] = bar
-                # Otherwise, use previous data to backfill
-                elif vt_symbol in bars:
-                    old_bar = bars[vt_symbol]
-
-                    bar = BarData(
-                        symbol=old_bar.symbol,
-                        exchange=old_bar.exchange,
-                        datetime=dt,
-                        open_price=old_bar.close_price,
-                        high_price=old_bar.close_price,
-                        low_price=old_bar.close_price,
-                        close_price=old_bar.close_price,
-                        gateway_name=old_bar.gateway_name
-                    )
-                    bars[vt_symbol] = bar
-
-            self.call_strategy_func(strategy, strategy.on_bars, bars)
+        for ix in range(len(history_data)):
+            valid = history_data.valid[ix].tolist()
+            synthetic = history_data.synthetic[ix].tolist()
 
-    def load_bar(self, vt_symbol: str, days: int, interval: Interval) -> List[BarData]:
+            for col, vt_symbol in enumerate(vt_symbols):
+                if valid[col] or synthetic[col]:
+                    bars[vt_symbol] = history_data.get_bar(ix, col)
+
+            self.run_strategy_func(strategy, strategy.on_bars, bars)
+
+            # Only real bars are aggregated into windows, same as live
+            if warmup_fanout:
+                warmup_fanout.update_bars({
+                    vt_symbol: bars[vt_symbol]
+                    for col, vt_symbol in enumerate(vt_symbols) if valid[col]
+                })
+
+    def subscribe_window(
+        self,
+        strategy: StrategyTemplate,
+        window: int,
+        interval: Interval,
+        callback: Callable,
+        calendar: TradingCalendar = None
+    ):
+        """
+        Subscribe window bars from fanout shared by strategies trading the
+        same vt_symbols, closed by trading sessions if calendar provided.
+        """
+        # Same vt_symbols listed in different order share one fanout
+        key = tuple(sorted(strategy.vt_symbols))
+
+        fanout = self.bar_fanouts.get(key, None)
+        if not fanout:
+            fanout = PortfolioBarFanout(key)
+            self.bar_fanouts[key] = fanout
+
+        subscriber = partial(self.push_strategy_bars, strategy, callback)
+        fanout.subscribe(subscriber, window, interval, calendar)
+
+        self.strategy_subscriptions[strategy.strategy_name].append(
+            (fanout, subscriber, window, interval, callback, calendar)
+        )
+
+        self.update_tick_dispatch()
+
+    def unsubscribe_windows(self, strategy_name: str):
+        """
+        Remove all window bars subscriptions of strategy.
+        """
+        for fanout, subscriber, *_ in self.strategy_subscriptions.pop(strategy_name, []):
+            fanout.unsubscribe(subscriber)
+
+            if fanout.is_empty():
+                self.bar_fanouts.pop(tuple(fanout.vt_symbols), None)
+
+        self.update_tick_dispatch()
+
+    def register_bar_generator(self, strategy: StrategyTemplate, generator: PortfolioBarGenerator):
+        """
+        Register bar generator owned by strategy to be flushed by timer.
+        """
+        generators = self.strategy_generators[strategy.strategy_name]
+        if generator not in generators:
+            generators.append(generator)
+
+    def push_strategy_bars(self, strategy: StrategyTemplate, callback: Callable, data: Any):
         """"""
-        symbol, exchange = extract_vt_symbol(vt_symbol)
+        if strategy.inited:
+            self.dispatch_strategy_func(strategy, callback, data)
+
+    def create_warmup_fanout(self, strategy: StrategyTemplate) -> PortfolioBarFanout:
+        """
+        Create fanout for history bars with the same windows subscribed by
+        strategy.
+        """
+        subscriptions = self.strategy_subscriptions.get(strategy.strategy_name, None)
+        if not subscriptions:
+            return None
+
+        fanout = PortfolioBarFanout(sorted(strategy.vt_symbols))
+
+        for _, _, window, interval, callback, calendar in subscriptions:
+            fanout.subscribe(
+                partial(self.run_strategy_func, strategy, callback),
+                window,
+                interval,
+                calendar
+            )
+
+        return fanout
+
+    def get_history_future(self, vt_symbol: str, days: int, interval: Interval) -> Future:
+        """
+        Get future of history data loading, requests of the same data are
+        shared while strategies are initing.
+        """
+        key = (vt_symbol, days, interval)
+
+        with self.init_lock:
+            future = self.history_futures.get(key, None)
+
+            if not future:
+                future = self.fetch_executor.submit(self.load_bar, vt_symbol, days, interval)
+
+                if self.init_pending:
+                    self.history_futures[key] = future
+
+        return future
+
+    def load_bar(self, vt_symbol: str, days: int, interval: Interval) -> List[BarData]:
+        """
+        Load history bars with cache, only bars not in cache are queried.
+        """
         end = datetime.now(get_localzone())
         start = end - timedelta(days)
+        key = (vt_symbol, interval)
+
+        # Clear cache when new session started
+        session = (end - timedelta(hours=self.session_roll_hour)).date()
+
+        with self.history_lock:
+            if session != self.history_session:
+                self.history_cache.clear()
+                self.history_session = session
+
+            history = self.history_cache.get(key, None)
+
+        # Cache hit is served by slicing, while tail of cache is refreshed
+        # at most once per interval for all strategies.
+        if history and history.start <= start:
+            refresh_delta = INTERVAL_DELTA_MAP.get(interval, timedelta(minutes=1))
+
+            with history.refresh_lock:
+                if end - history.refresh_time >= refresh_delta:
+                    data = self.query_bar(vt_symbol, interval, history.get_end(), end)
+                    history.update(data, end)
+        else:
+            data = self.query_bar(vt_symbol, interval, start, end)
+            if not data:
+                return data
+
+            history = BarHistory(start, end, data)
+            with self.history_lock:
+                cached = self.history_cache.get(key, None)
+                if not cached or cached.start > start:
+                    self.history_cache[key] = history
+
+        return history.get_bars(start)
+
+    def clear_history_cache(self) -> None:
+        """
+        Clear history bars cached.
+        """
+        with self.history_lock:
+            self.history_cache.clear()
+
+    def query_bar(self, vt_symbol: str, interval: Interval, start: datetime, end: datetime) -> List[BarData]:
+        """
+        Query history bars from gateway, datafeed or database.
+        """
+        symbol, exchange = extract_vt_symbol(vt_symbol)
         contract: ContractData = self.main_engine.get_contract(vt_symbol)
         data = []
 
@@ -353,11 +885,19 @@ class StrategyEngine(BaseEngine):
             else:
                 func()
         except Exception:
-            strategy.trading = False
-            strategy.inited = False
+            self.process_strategy_exception(strategy)
+
+    def process_strategy_exception(self, strategy: StrategyTemplate):
+        """
+        Stop strategy after exception raised from its callback.
+        """
+        strategy.trading = False
+        strategy.inited = False
 
-            msg = f"触发异常已停止\n{traceback.format_exc()}"
-            self.write_log(msg, strategy)
+        msg = f"触发异常已停止\n{traceback.format_exc()}"
+        self.write_log(msg, strategy)
+
+        self.update_tick_dispatch()
 
     def add_strategy(
         self, class_name: str, strategy_name: str, vt_symbols: list, setting: dict
@@ -377,19 +917,42 @@ class StrategyEngine(BaseEngine):
         strategy = strategy_class(self, strategy_name, vt_symbols, setting)
         self.strategies[strategy_name] = strategy
 
+        if strategy.worker_name:
+            self.strategy_worker_map[strategy_name] = self.get_worker(strategy.worker_name)
+
         # Add vt_symbol to strategy map.
         for vt_symbol in vt_symbols:
             strategies = self.symbol_strategy_map[vt_symbol]
             strategies.append(strategy)
 
         self.save_strategy_setting()
-        self.put_strategy_event(strategy)
+        self.put_strategy_full_event(strategy)
 
     def init_strategy(self, strategy_name: str):
         """
         Init a strategy.
         """
-        self.init_executor.submit(self._init_strategy, strategy_name)
+        with self.init_lock:
+            if strategy_name in self.init_pending:
+                self.write_log(f"{strategy_name}正在执行初始化，禁止重复操作")
+                return
+            self.init_pending.add(strategy_name)
+
+        self.init_executor.submit(self.run_init_task, strategy_name)
+
+    def run_init_task(self, strategy_name: str):
+        """
+        Run init of a strategy and release shared history data after all
+        pending strategies inited.
+        """
+        try:
+            self._init_strategy(strategy_name)
+        finally:
+            with self.init_lock:
+                self.init_pending.discard(strategy_name)
+
+                if not self.init_pending:
+                    self.history_futures.clear()
 
     def _init_strategy(self, strategy_name: str):
         """
@@ -403,8 +966,12 @@ class StrategyEngine(BaseEngine):
 
         self.write_log(f"{strategy_name}开始执行初始化")
 
+        # Windows and bar generators are registered again by on_init
+        self.unsubscribe_windows(strategy_name)
+        self.strategy_generators.pop(strategy_name, None)
+
         # Call on_init function of strategy
-        self.call_strategy_func(strategy, strategy.on_init)
+        self.run_strategy_func(strategy, strategy.on_init)
 
         # Restore strategy data(variables)
         data = self.strategy_data.get(strategy_name, None)
@@ -429,7 +996,8 @@ class StrategyEngine(BaseEngine):
 
         # Put event to update init completed status.
         strategy.inited = True
-        self.put_strategy_event(strategy)
+        self.update_tick_dispatch()
+        self.put_strategy_full_event(strategy)
         self.write_log(f"{strategy_name}初始化完成")
 
     def start_strategy(self, strategy_name: str):
@@ -445,10 +1013,10 @@ class StrategyEngine(BaseEngine):
             self.write_log(f"{strategy_name}已经启动，请勿重复操作")
             return
 
-        self.call_strategy_func(strategy, strategy.on_start)
+        self.run_strategy_func(strategy, strategy.on_start)
         strategy.trading = True
 
-        self.put_strategy_event(strategy)
+        self.put_strategy_full_event(strategy)
 
     def stop_strategy(self, strategy_name: str):
         """
@@ -459,19 +1027,19 @@ class StrategyEngine(BaseEngine):
             return
 
         # Call on_stop function of the strategy
-        self.call_strategy_func(strategy, strategy.on_stop)
+        self.run_strategy_func(strategy, strategy.on_stop)
 
         # Change trading status of strategy to False
         strategy.trading = False
 
         # Cancel all orders of the strategy
-        strategy.cancel_all()
+        self.run_strategy_func(strategy, strategy.cancel_all)
 
         # Sync strategy variables to data file
-        self.sync_strategy_data(strategy)
+        self.run_strategy_func(strategy, self.sync_strategy_data, strategy)
 
         # Update GUI
-        self.put_strategy_event(strategy)
+        self.put_strategy_full_event(strategy)
 
     def edit_strategy(self, strategy_name: str, setting: dict):
         """
@@ -481,7 +1049,7 @@ class StrategyEngine(BaseEngine):
         strategy.update_setting(setting)
 
         self.save_strategy_setting()
-        self.put_strategy_event(strategy)
+        self.put_strategy_full_event(strategy)
 
     def remove_strategy(self, strategy_name: str):
         """
@@ -504,8 +1072,17 @@ class StrategyEngine(BaseEngine):
 
         # Remove from strategies
         self.strategies.pop(strategy_name)
+        self.tick_conflators.pop(strategy_name, None)
+        with self.event_lock:
+            self.event_texts.pop(strategy_name, None)
+            self.event_times.pop(strategy_name, None)
+        self.strategy_worker_map.pop(strategy_name, None)
         self.save_strategy_setting()
 
+        # Remove from window bar fanouts
+        self.unsubscribe_windows(strategy_name)
+        self.strategy_generators.pop(strategy_name, None)
+
         return True
 
     def load_strategy_class(self):
@@ -550,6 +1127,10 @@ class StrategyEngine(BaseEngine):
         """
         self.strategy_data = load_json(self.data_filename)
 
+        # Apply strategy data not yet written into data file
+        for record in self.json_writer.load_journal(self.data_filename):
+            self.strategy_data[record["strategy_name"]] = record["data"]
+
     def sync_strategy_data(self, strategy: StrategyTemplate):
         """
         Sync strategy data into json file.
@@ -558,8 +1139,16 @@ class StrategyEngine(BaseEngine):
         data.pop("inited")      # Strategy status (inited, trading) should not be synced.
         data.pop("trading")
 
+        # Copy data to avoid change before written by background thread
+        data = deepcopy(data)
         self.strategy_data[strategy.strategy_name] = data
-        save_json(self.data_filename, self.strategy_data)
+
+        if self.data_journal:
+            record = {"strategy_name": strategy.strategy_name, "data": data}
+        else:
+            record = None
+
+        self.json_writer.put(self.data_filename, dict(self.strategy_data), record)
 
     def get_all_strategy_class_names(self):
         """
@@ -631,13 +1220,66 @@ class StrategyEngine(BaseEngine):
                 "setting": strategy.get_parameters()
             }
 
-        save_json(self.setting_filename, strategy_setting)
+        self.json_writer.put(self.setting_filename, strategy_setting)
 
     def put_strategy_event(self, strategy: StrategyTemplate):
         """
-        Put an event to update strategy status.
+        Put an event to update strategy variables changed, no more than
+        strategy event rate per second (not throttled if rate is 0).
+        """
+        now = time()
+
+        with self.event_lock:
+            last = self.event_times.get(strategy.strategy_name, 0)
+
+            # Update within interval is sent by timer
+            if self.strategy_event_rate and now - last < 1 / self.strategy_event_rate:
+                self.event_pending.add(strategy.strategy_name)
+                return
+
+            self.put_strategy_update_event(strategy, now)
+
+    def put_strategy_update_event(self, strategy: StrategyTemplate, now: float):
+        """
+        Put an event with strategy variables changed since last event.
+        """
+        strategy_name = strategy.strategy_name
+
+        with self.event_lock:
+            self.event_times[strategy_name] = now
+            self.event_pending.discard(strategy_name)
+
+            texts = self.event_texts.setdefault(strategy_name, {})
+            variables = {}
+
+            for name, value in strategy.get_variables().items():
+                text = str(value)
+                if texts.get(name, None) != text:
+                    texts[name] = text
+                    variables[name] = value
+
+        if not variables:
+            return
+
+        data = {"strategy_name": strategy_name, "variables": variables}
+        event = Event(EVENT_PORTFOLIO_STRATEGY, data)
+        self.event_engine.put(event)
+
+    def put_strategy_full_event(self, strategy: StrategyTemplate):
+        """
+        Put an event to update strategy status with full data.
         """
         data = strategy.get_data()
+
+        strategy_name = strategy.strategy_name
+
+        with self.event_lock:
+            self.event_times[strategy_name] = time()
+            self.event_texts[strategy_name] = {
+                name: str(value) for name, value in data["variables"].items()
+            }
+            self.event_pending.discard(strategy_name)
+
         event = Event(EVENT_PORTFOLIO_STRATEGY, data)
         self.event_engine.put(event)
 
@@ -662,3 +1304,407 @@ class StrategyEngine(BaseEngine):
             subject = "组合策略引擎"
 
         self.main_engine.send_email(subject, msg)
+
+
+class BarHistory:
+    """
+    History bars of one vt_symbol and interval loaded from start, with
+    time of the last query refreshing its tail.
+    """
+
+    def __init__(self, start: datetime, refresh_time: datetime, bars: List[BarData]):
+        """"""
+        self.start: datetime = start
+        self.bars: List[BarData] = bars
+        self.dts: List[datetime] = [bar.datetime for bar in bars]
+
+        self.naive: bool = self.dts[0].tzinfo is None
+        self.lock: Lock = Lock()
+
+        self.refresh_time: datetime = refresh_time
+        self.refresh_lock: Lock = Lock()
+
+    def get_end(self) -> datetime:
+        """"""
+        return self.dts[-1]
+
+    def update(self, bars: List[BarData], refresh_time: datetime) -> None:
+        """
+        Append new bars after the last one.
+        """
+        self.refresh_time = refresh_time
+
+        with self.lock:
+            for bar in bars:
+                if bar.datetime > self.dts[-1]:
+                    self.bars.append(bar)
+                    self.dts.append(bar.datetime)
+
+    def get_bars(self, start: datetime) -> List[BarData]:
+        """
+        Get bars from start by slicing.
+        """
+        if self.naive:
+            start = start.replace(tzinfo=None)
+
+        with self.lock:
+            ix = bisect_left(self.dts, start)
+            return self.bars[ix:]
+
+
+class JsonWriter:
+    """
+    Background writer of json files.
+
+    Only the latest data of each file is written, through a temp file and
+    rename. Journal records are appended before data written, and the
+    journal is removed after data written.
+    """
+
+    def __init__(self, write_log: Callable, interval: float = 0):
+        """"""
+        self.write_log: Callable = write_log
+        self.interval: float = interval
+
+        self.pending: Dict[str, dict] = {}
+        self.records: Dict[str, List[dict]] = defaultdict(list)
+        self.write_times: Dict[str, float] = {}
+
+        self.condition: Condition = Condition()
+        self.thread: Thread = Thread(target=self.run, name=f"{APP_NAME}_writer", daemon=True)
+        self.active: bool = False
+
+    def start(self) -> None:
+        """"""
+        self.active = True
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop after all pending data written.
+        """
+        if not self.active:
+            return
+
+        with self.condition:
+            self.active = False
+            self.condition.notify()
+
+        self.thread.join()
+
+    def put(self, filename: str, data: dict, record: dict = None) -> None:
+        """"""
+        with self.condition:
+            self.pending[filename] = data
+
+            if record is not None:
+                self.records[filename].append(record)
+
+            self.condition.notify()
+
+    def run(self) -> None:
+        """"""
+        while True:
+            with self.condition:
+                if not self.pending and not self.records:
+                    if not self.active:
+                        return
+                    self.condition.wait()
+                    continue
+
+                records = self.records
+                self.records = defaultdict(list)
+
+                # Data written within interval is delayed, except on stop
+                now = time()
+                pending = {}
+                wait = self.interval
+
+                for filename, data in list(self.pending.items()):
+                    remain = self.write_times.get(filename, 0) + self.interval - now
+                    if remain <= 0 or not self.active:
+                        pending[filename] = self.pending.pop(filename)
+                    else:
+                        wait = min(wait, remain)
+
+            for filename, lines in records.items():
+                try:
+                    self.append_journal(filename, lines)
+                except Exception:
+                    self.write_log(f"日志文件写入失败{filename}\n{traceback.format_exc()}")
+
+            for filename, data in pending.items():
+                try:
+                    self.write_json(filename, data)
+                except Exception:
+                    self.write_log(f"文件写入失败{filename}\n{traceback.format_exc()}")
+                self.write_times[filename] = time()
+
+            if not records and not pending:
+                with self.condition:
+                    self.condition.wait(wait)
+
+    def write_json(self, filename: str, data: dict) -> None:
+        """"""
+        filepath: Path = get_file_path(filename)
+        temp_path: Path = filepath.with_name(filepath.name + ".tmp")
+
+        with open(temp_path, mode="w+", encoding="UTF-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, filepath)
+
+        # Records in journal are all included in data written
+        journal_path: Path = self.get_journal_path(filename)
+        if journal_path.exists():
+            journal_path.unlink()
+
+    def append_journal(self, filename: str, records: List[dict]) -> None:
+        """"""
+        journal_path: Path = self.get_journal_path(filename)
+
+        with open(journal_path, mode="a", encoding="UTF-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load_journal(self, filename: str) -> List[dict]:
+        """
+        Load records not yet written into data file.
+        """
+        journal_path: Path = self.get_journal_path(filename)
+        if not journal_path.exists():
+            return []
+
+        records = []
+
+        with open(journal_path, mode="r", encoding="UTF-8") as f:
+            for line in f:
+                # The last line may be incomplete
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+
+        return records
+
+    def get_journal_path(self, filename: str) -> Path:
+        """"""
+        filepath: Path = get_file_path(filename)
+        return filepath.with_suffix(".journal")
+
+
+class TradeIdFilter:
+    """
+    Set of recent vt_tradeids with bounded memory.
+
+    Ids are stored in two generations of at most window size each, the
+    older generation is dropped when the current one is full.
+    """
+
+    def __init__(self, window: int):
+        """"""
+        self.window: int = window
+
+        self.current: Set[str] = set()
+        self.previous: Set[str] = set()
+
+    def __contains__(self, vt_tradeid: str) -> bool:
+        """"""
+        return vt_tradeid in self.current or vt_tradeid in self.previous
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.current) + len(self.previous)
+
+    def add(self, vt_tradeid: str) -> None:
+        """"""
+        if len(self.current) >= self.window:
+            self.previous = self.current
+            self.current = set()
+
+        self.current.add(vt_tradeid)
+
+
+class TickConflator:
+    """
+    Keep only the latest tick of each vt_symbol for a strategy.
+
+    Ticks are delivered by an event put into the event engine queue, or by
+    the worker thread of the strategy, all ticks arrived before delivery
+    are conflated.
+    """
+
+    def __init__(self, strategy: StrategyTemplate, schedule: Callable):
+        """"""
+        self.strategy: StrategyTemplate = strategy
+        self.schedule: Callable = schedule
+
+        self.lock: Lock = Lock()
+        self.ticks: Dict[str, TickData] = {}
+        self.scheduled: bool = False
+
+        # vt_symbols with tick replaced since last delivery
+        self.replaced: Set[str] = set()
+
+        self.received: int = 0
+        self.delivered: int = 0
+        self.dropped: int = 0
+        self.coalesced: int = 0
+
+    def put_tick(self, tick: TickData) -> None:
+        """"""
+        with self.lock:
+            self.received += 1
+
+            vt_symbol = tick.vt_symbol
+            if vt_symbol in self.ticks:
+                self.dropped += 1
+                self.replaced.add(vt_symbol)
+            self.ticks[vt_symbol] = tick
+
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        self.schedule(self)
+
+    def pop_ticks(self) -> List[TickData]:
+        """"""
+        with self.lock:
+            ticks = list(self.ticks.values())
+            self.ticks.clear()
+            self.scheduled = False
+
+            self.delivered += len(ticks)
+            self.coalesced += len(self.replaced)
+            self.replaced.clear()
+
+        return ticks
+
+    def get_stats(self) -> Dict[str, int]:
+        """"""
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
+
+
+class StrategyWorker:
+    """
+    Worker thread running callbacks of a group of strategies.
+
+    Order, trade and lifecycle calls are queued in an unbounded lane run
+    before ticks, while ticks are dropped when the bounded tick lane is
+    full, so that the event engine thread never waits for a slow strategy.
+    """
+
+    def __init__(self, name: str, strategy_engine: StrategyEngine, queue_size: int):
+        """"""
+        self.name: str = name
+        self.strategy_engine: StrategyEngine = strategy_engine
+        self.queue_size: int = queue_size
+
+        self.calls: Deque[tuple] = deque()
+        self.ticks: Deque[tuple] = deque()
+        self.condition: Condition = Condition()
+
+        self.thread: Thread = Thread(target=self.run, name=f"{APP_NAME}_{name}", daemon=True)
+        self.active: bool = False
+
+        self.dropped: int = 0
+
+    def start(self) -> None:
+        """"""
+        self.active = True
+        self.thread.start()
+
+    def stop(self) -> None:
+        """"""
+        with self.condition:
+            self.active = False
+            self.condition.notify()
+
+        self.thread.join()
+
+    def put(
+        self,
+        strategy: StrategyTemplate,
+        func: Callable,
+        params: Any = None,
+        future: Future = None
+    ) -> None:
+        """"""
+        with self.condition:
+            self.calls.append((strategy, func, params, future))
+            self.condition.notify()
+
+    def call(self, strategy: StrategyTemplate, func: Callable, params: Any = None) -> None:
+        """
+        Put function into worker and wait until it is finished, called
+        directly if already in worker thread or worker stopped.
+        """
+        if not self.active or current_thread() is self.thread:
+            self.strategy_engine.call_strategy_func(strategy, func, params)
+            return
+
+        future: Future = Future()
+        self.put(strategy, func, params, future)
+        future.result()
+
+    def put_tick(self, strategy: StrategyTemplate, tick: TickData) -> None:
+        """"""
+        with self.condition:
+            if len(self.ticks) >= self.queue_size:
+                self.dropped += 1
+                return
+
+            self.ticks.append((strategy, strategy.on_tick, tick, None))
+            self.condition.notify()
+
+    def put_conflator(self, conflator: TickConflator) -> None:
+        """
+        Put conflator scheduled for delivery, which is never dropped as
+        there is at most one pending for each strategy.
+        """
+        with self.condition:
+            self.ticks.append((conflator.strategy, None, conflator, None))
+            self.condition.notify()
+
+    def get_depth(self) -> int:
+        """"""
+        return len(self.calls) + len(self.ticks)
+
+    def run(self) -> None:
+        """"""
+        while True:
+            with self.condition:
+                while self.active and not self.calls and not self.ticks:
+                    self.condition.wait()
+
+                if self.calls:
+                    strategy, func, params, future = self.calls.popleft()
+                elif self.ticks and self.active:
+                    strategy, func, params, future = self.ticks.popleft()
+                else:
+                    return
+
+            # Strategy may be stopped by exception after tick queued
+            if isinstance(params, TickData) and not strategy.inited:
+                continue
+
+            # Latest ticks of conflator are popped when worker is free
+            if isinstance(params, TickConflator):
+                self.strategy_engine.deliver_conflated_ticks(params)
+                continue
+
+            try:
+                self.strategy_engine.call_strategy_func(strategy, func, params)
+            finally:
+                if future:
+                    future.set_result(None)
@@ -113,6 +113,8 @@ class ESTimeMomentumStrategy(StrategyTemplate):
         """
         self.write_log("策略初始化")
 
+        self.register_bar_generator(self.pbg)
+
         self.load_bars(self.window + 1)
 
     def on_start(self):
@@ -65,6 +65,8 @@ class PortfolioBollChannelStrategy(StrategyTemplate):
         """
         self.write_log("策略初始化")
 
+        self.register_bar_generator(self.pbg)
+
         self.load_bars(10)
 
     def on_start(self):
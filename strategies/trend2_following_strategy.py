@@ -70,6 +70,8 @@ class Trend2FollowingStrategy(StrategyTemplate):
         """
         self.write_log("策略初始化")
 
+        self.register_bar_generator(self.pbg)
+
         self.rsi_buy = 50 + self.rsi_entry
         self.rsi_sell = 50 - self.rsi_entry
 
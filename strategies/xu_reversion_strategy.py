@@ -115,6 +115,8 @@ class XUReversionStrategy(StrategyTemplate):
         """
         self.write_log("策略初始化")
 
+        self.register_bar_generator(self.pbg)
+
         self.load_bars(6)   # 6 = 6 days
         # self.write_log(self.anchor_debug)
 
@@ -271,7 +273,7 @@ class XUReversionStrategy(StrategyTemplate):
         # open_orderids
         pending_order = False
         order_summary = ""
-        for vt_orderid in self.open_orderids:
+        for vt_orderid in list(self.open_orderids):
             order = self.get_order(vt_orderid)
             if order:
                 if order.traded > 0:
@@ -306,6 +308,8 @@ class XUReversionStrategy(StrategyTemplate):
         ########## Cancel old order when exceed algo limit and place new order ##########
         # get_all_active_orderids
         all_active_orderids = self.get_all_active_orderids()
+        # Fake submitting orders no longer active are not checked again
+        self.fake_orderids = [vt_orderid for vt_orderid in self.fake_orderids if vt_orderid in all_active_orderids]
         fake_submitting = False
         no_active_orderids = True
         if all_active_orderids:
@@ -1,13 +1,15 @@
 """"""
 from abc import ABC
 from copy import copy
-from typing import Dict, Set, List, TYPE_CHECKING
+from typing import Callable, Dict, Set, List, TYPE_CHECKING
 from collections import defaultdict
 
 from vnpy.trader.constant import Interval, Direction, Offset
 from vnpy.trader.object import BarData, TickData, OrderData, TradeData
 from vnpy.trader.utility import virtual
 
+from .utility import PortfolioBarArray, PortfolioBarGenerator, TradingCalendar
+
 if TYPE_CHECKING:
     from .engine import StrategyEngine
 
@@ -19,6 +21,22 @@ class StrategyTemplate(ABC):
     parameters = []
     variables = []
 
+    # Only deliver the latest tick of each vt_symbol when ticks arrive
+    # faster than on_tick can process them.
+    tick_conflation = False
+
+    # Run callbacks in worker thread with this name, strategies with the
+    # same worker name share one thread.
+    worker_name = ""
+
+    # Receive history data loaded by load_bars at once with on_history,
+    # instead of replaying it bar by bar with on_bars.
+    columnar_warmup = False
+
+    # Receive 1 minute bars built by engine from ticks with on_bars, bars
+    # of each vt_symbol are built only once for all strategies.
+    shared_bars = False
+
     def __init__(
         self,
         strategy_engine: "StrategyEngine",
@@ -132,6 +150,13 @@ class StrategyTemplate(ABC):
         """
         pass
 
+    @virtual
+    def on_history(self, history_data: PortfolioBarArray) -> None:
+        """
+        Callback of aligned history data loaded when columnar warmup is on.
+        """
+        pass
+
     def update_trade(self, trade: TradeData) -> None:
         """
         Callback of new trade data update.
@@ -219,7 +244,13 @@ class StrategyTemplate(ABC):
 
     def get_order(self, vt_orderid: str) -> OrderData:
         """"""
-        return self.orders.get(vt_orderid, None)
+        order = self.orders.get(vt_orderid, None)
+
+        # Finished orders may be retired from strategy
+        if not order:
+            order = self.strategy_engine.get_order(self, vt_orderid)
+
+        return order
 
     def get_all_active_orderids(self) -> List[OrderData]:
         """"""
@@ -246,6 +277,28 @@ class StrategyTemplate(ABC):
         """
         self.strategy_engine.load_bars(self, days, interval)
 
+    def subscribe_window(
+        self,
+        window: int,
+        callback: Callable,
+        interval: Interval = Interval.MINUTE,
+        calendar: TradingCalendar = None
+    ) -> None:
+        """
+        Subscribe window bars shared with other strategies of the same
+        vt_symbols. Callback receives PortfolioBarArray of window bars, or
+        bars dict if 1 minute bars subscribed. Windows are closed by trading
+        sessions if calendar provided.
+        """
+        self.strategy_engine.subscribe_window(self, window, interval, callback, calendar)
+
+    def register_bar_generator(self, generator: PortfolioBarGenerator) -> None:
+        """
+        Register bar generator owned by strategy, so that its 1 minute bars
+        are flushed by timer when no new tick arrives after minute end.
+        """
+        self.strategy_engine.register_bar_generator(self, generator)
+
     def put_event(self) -> None:
         """
         Put an strategy data event for ui update.
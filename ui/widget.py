@@ -115,7 +115,8 @@ class PortfolioStrategyManager(QtWidgets.QWidget):
         if strategy_name in self.managers:
             manager = self.managers[strategy_name]
             manager.update_data(data)
-        else:
+        # Variables update event only contains changed variables
+        elif "parameters" in data:
             manager = StrategyManager(self, self.strategy_engine, data)
             self.scroll_layout.insertWidget(0, manager)
             self.managers[strategy_name] = manager
@@ -227,13 +228,17 @@ class StrategyManager(QtWidgets.QFrame):
 
     def update_data(self, data: dict):
         """"""
-        self._data = data
+        # Full data event or variables update event
+        if "parameters" in data:
+            self._data = data
+            self.parameters_monitor.update_data(data["parameters"])
+        else:
+            self._data["variables"].update(data["variables"])
 
-        self.parameters_monitor.update_data(data["parameters"])
         self.variables_monitor.update_data(data["variables"])
 
         # Update button status
-        variables = data["variables"]
+        variables = self._data["variables"]
         inited = variables["inited"]
         trading = variables["trading"]
 
@@ -325,7 +330,10 @@ class DataMonitor(QtWidgets.QTableWidget):
         """"""
         for name, value in data.items():
             cell = self.cells[name]
-            cell.setText(str(value))
+
+            text = str(value)
+            if cell.text() != text:
+                cell.setText(text)
 
 
 class LogMonitor(BaseMonitor):
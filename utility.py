@@ -1,7 +1,565 @@
-from datetime import datetime
-from typing import Callable, Dict
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Tuple
 
+import numpy as np
+
+from vnpy.trader.constant import Exchange
 from vnpy.trader.object import BarData, TickData, Interval
+from vnpy.trader.database import DB_TZ
+from vnpy.trader.utility import extract_vt_symbol
+
+
+BAR_FIELDS: List[str] = [
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "turnover",
+    "open_interest"
+]
+
+
+EPOCH: datetime = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_timestamp(dt: datetime) -> int:
+    """
+    Convert datetime into epoch microseconds, naive datetime is in database timezone.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=DB_TZ)
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_timestamp(ts: int, naive: bool) -> datetime:
+    """
+    Convert epoch microseconds back into datetime of database timezone.
+    """
+    dt: datetime = (EPOCH + timedelta(microseconds=ts)).astimezone(DB_TZ)
+    if naive:
+        dt = dt.replace(tzinfo=None)
+    return dt
+
+
+def bars_to_array(bars: List[BarData]) -> Tuple[List[datetime], np.ndarray]:
+    """
+    Convert bar data list into datetime list and (n, 7) float64 array.
+    """
+    dts: List[datetime] = [bar.datetime for bar in bars]
+
+    values: np.ndarray = np.array(
+        [
+            (
+                bar.open_price,
+                bar.high_price,
+                bar.low_price,
+                bar.close_price,
+                bar.volume,
+                bar.turnover,
+                bar.open_interest
+            )
+            for bar in bars
+        ],
+        dtype=np.float64
+    ).reshape(len(bars), len(BAR_FIELDS))
+
+    return dts, values
+
+
+def is_synthetic(bar: BarData) -> bool:
+    """
+    Check if bar is backfilled with previous close rather than real data.
+    """
+    extra: dict = getattr(bar, "extra", None)
+    return bool(extra and extra.get("synthetic", False))
+
+
+class PortfolioBarArray:
+    """
+    组合K线数组
+
+    Columnar bar data of a portfolio aligned on one datetime index, each
+    field is a float64 array shaped (n_timestamps, n_symbols).
+    """
+
+    def __init__(
+        self,
+        vt_symbols: List[str],
+        dts: List[datetime],
+        interval: Interval = None,
+        gateway_name: str = "DB",
+        data: np.ndarray = None,
+        valid: np.ndarray = None,
+        synthetic: np.ndarray = None
+    ):
+        """Constructor"""
+        self.vt_symbols: List[str] = list(vt_symbols)
+        self.dts: List[datetime] = dts
+        self.interval: Interval = interval
+        self.gateway_name: str = gateway_name
+
+        self.symbol_index: Dict[str, int] = {
+            vt_symbol: ix for ix, vt_symbol in enumerate(self.vt_symbols)
+        }
+        self.contracts: List[tuple] = [
+            extract_vt_symbol(vt_symbol) for vt_symbol in self.vt_symbols
+        ]
+
+        shape: tuple = (len(BAR_FIELDS), len(dts), len(self.vt_symbols))
+
+        if data is None:
+            data = np.full(shape, np.nan, dtype=np.float64)
+        self.data: np.ndarray = data
+
+        # Whether a bar of the symbol exists at the datetime
+        if valid is None:
+            valid = np.zeros(shape[1:], dtype=bool)
+        self.valid: np.ndarray = valid
+
+        # Whether the bar is backfilled by forward_fill
+        if synthetic is None:
+            synthetic = np.zeros(shape[1:], dtype=bool)
+        self.synthetic: np.ndarray = synthetic
+
+        # Shared memory block holding the arrays, if published or attached
+        self.shm: SharedMemory = None
+
+        # Field arrays are views into the same data block
+        self.open_price: np.ndarray = data[0]
+        self.high_price: np.ndarray = data[1]
+        self.low_price: np.ndarray = data[2]
+        self.close_price: np.ndarray = data[3]
+        self.volume: np.ndarray = data[4]
+        self.turnover: np.ndarray = data[5]
+        self.open_interest: np.ndarray = data[6]
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.dts)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        vt_symbols: List[str],
+        columns: Dict[str, Tuple[List[datetime], np.ndarray]],
+        interval: Interval = None,
+        gateway_name: str = "DB",
+        last_closes: np.ndarray = None
+    ) -> "PortfolioBarArray":
+        """
+        Align per symbol (dts, values) pairs onto the union datetime index.
+
+        last_closes is close price of each symbol before the first row, used
+        for backfilling when data is aligned chunk by chunk.
+        """
+        dt_set: set = set()
+        for dts, _ in columns.values():
+            dt_set.update(dts)
+
+        dts: List[datetime] = sorted(dt_set)
+        dt_rows: Dict[datetime, int] = {dt: ix for ix, dt in enumerate(dts)}
+
+        array: PortfolioBarArray = cls(vt_symbols, dts, interval, gateway_name)
+
+        for vt_symbol, (symbol_dts, values) in columns.items():
+            if not symbol_dts:
+                continue
+
+            col: int = array.symbol_index[vt_symbol]
+            rows: np.ndarray = np.fromiter(
+                (dt_rows[dt] for dt in symbol_dts),
+                dtype=np.int64,
+                count=len(symbol_dts)
+            )
+
+            array.data[:, rows, col] = values.T
+            array.valid[rows, col] = True
+
+        array.forward_fill(last_closes)
+        return array
+
+    @classmethod
+    def from_bars(
+        cls,
+        vt_symbols: List[str],
+        history: Dict[str, List[BarData]],
+        interval: Interval = None,
+        gateway_name: str = "DB"
+    ) -> "PortfolioBarArray":
+        """
+        Align bar data lists of each symbol into array.
+        """
+        columns: dict = {
+            vt_symbol: bars_to_array(bars) for vt_symbol, bars in history.items()
+        }
+        return cls.from_arrays(vt_symbols, columns, interval, gateway_name)
+
+    def forward_fill(self, last_closes: np.ndarray = None) -> None:
+        """
+        Backfill missing bars with previous close price in one pass.
+        """
+        n: int = len(self.dts)
+
+        # Row of the latest real bar for each cell, -1 before first bar
+        rows: np.ndarray = np.where(self.valid, np.arange(n)[:, None], -1)
+        np.maximum.accumulate(rows, axis=0, out=rows)
+
+        # Cells before first bar can be backfilled with close of last chunk
+        if last_closes is None:
+            seeded: np.ndarray = np.zeros(len(self.vt_symbols), dtype=bool)
+        else:
+            seeded: np.ndarray = ~np.isnan(last_closes)
+
+        self.synthetic = ~self.valid & ((rows >= 0) | seeded)
+        ix, col = np.nonzero(self.synthetic)
+
+        row: np.ndarray = rows[ix, col]
+        close: np.ndarray = np.where(
+            row >= 0,
+            self.close_price[np.maximum(row, 0), col],
+            last_closes[col] if last_closes is not None else np.nan
+        )
+        self.open_price[ix, col] = close
+        self.high_price[ix, col] = close
+        self.low_price[ix, col] = close
+        self.close_price[ix, col] = close
+        self.volume[ix, col] = 0
+        self.turnover[ix, col] = 0
+        self.open_interest[ix, col] = 0
+
+    def share(self) -> dict:
+        """
+        Copy arrays into one shared memory block, return the handle for
+        other processes to attach.
+        """
+        n, m = self.valid.shape
+        timestamps: np.ndarray = np.array(
+            [to_timestamp(dt) for dt in self.dts], dtype=np.int64
+        )
+
+        self.shm = SharedMemory(create=True, size=max(get_shared_size(n, m), 1))
+        data, shared_timestamps, valid, synthetic = get_shared_arrays(self.shm, n, m)
+
+        data[:] = self.data
+        shared_timestamps[:] = timestamps
+        valid[:] = self.valid
+        synthetic[:] = self.synthetic
+
+        return {
+            "name": self.shm.name,
+            "vt_symbols": self.vt_symbols,
+            "size": n,
+            "naive": bool(self.dts) and self.dts[0].tzinfo is None,
+            "interval": self.interval,
+            "gateway_name": self.gateway_name
+        }
+
+    @classmethod
+    def attach(cls, handle: dict) -> "PortfolioBarArray":
+        """
+        Create read-only array on the shared memory block without copying.
+        """
+        shm: SharedMemory = SharedMemory(name=handle["name"])
+
+        n: int = handle["size"]
+        m: int = len(handle["vt_symbols"])
+        data, timestamps, valid, synthetic = get_shared_arrays(shm, n, m)
+
+        for a in (data, valid, synthetic):
+            a.flags.writeable = False
+
+        naive: bool = handle["naive"]
+        dts: List[datetime] = [from_timestamp(ts, naive) for ts in timestamps.tolist()]
+
+        array: PortfolioBarArray = cls(
+            handle["vt_symbols"],
+            dts,
+            handle["interval"],
+            handle["gateway_name"],
+            data,
+            valid,
+            synthetic
+        )
+        array.shm = shm
+        return array
+
+    def unshare(self) -> None:
+        """
+        Destroy shared memory block created by share.
+        """
+        if not self.shm:
+            return
+
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def get_rows(self, start: int, end: int) -> "PortfolioBarArray":
+        """
+        Get rows within [start, end) as array sharing the same data.
+        """
+        return PortfolioBarArray(
+            self.vt_symbols,
+            self.dts[start:end],
+            self.interval,
+            self.gateway_name,
+            self.data[:, start:end],
+            self.valid[start:end],
+            self.synthetic[start:end]
+        )
+
+    def get_last_closes(self, default: np.ndarray = None) -> np.ndarray:
+        """
+        Get close price of each symbol at the last row, default (or nan if
+        not given) is returned if there is no data.
+        """
+        if not len(self.dts):
+            if default is not None:
+                return default
+            return np.full(len(self.vt_symbols), np.nan)
+        return self.close_price[-1].copy()
+
+    def get_bar(self, ix: int, col: int) -> BarData:
+        """
+        Create bar data object of the symbol column at row ix.
+        """
+        symbol, exchange = self.contracts[col]
+        values: list = self.data[:, ix, col].tolist()
+
+        bar: BarData = BarData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=self.dts[ix],
+            interval=self.interval,
+            open_price=values[0],
+            high_price=values[1],
+            low_price=values[2],
+            close_price=values[3],
+            volume=values[4],
+            turnover=values[5],
+            open_interest=values[6],
+            gateway_name=self.gateway_name
+        )
+
+        if self.synthetic[ix, col]:
+            bar.extra = {"synthetic": True}
+
+        return bar
+
+    def get_bars(self, ix: int) -> Dict[str, BarData]:
+        """
+        Create bar data dict of all symbols with data at row ix.
+        """
+        bars: Dict[str, BarData] = {}
+
+        for col in np.flatnonzero(self.valid[ix]).tolist():
+            bars[self.vt_symbols[col]] = self.get_bar(ix, col)
+
+        return bars
+
+
+def get_shared_size(n: int, m: int) -> int:
+    """
+    Get bytes of shared memory block for n timestamps and m symbols.
+    """
+    return len(BAR_FIELDS) * n * m * 8 + n * 8 + n * m * 2
+
+
+def get_shared_arrays(shm: SharedMemory, n: int, m: int) -> tuple:
+    """
+    Create data, timestamp, valid and synthetic arrays on shared memory block.
+    """
+    offset: int = 0
+
+    data: np.ndarray = np.ndarray(
+        (len(BAR_FIELDS), n, m), dtype=np.float64, buffer=shm.buf, offset=offset
+    )
+    offset += data.nbytes
+
+    timestamps: np.ndarray = np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=offset)
+    offset += timestamps.nbytes
+
+    valid: np.ndarray = np.ndarray((n, m), dtype=bool, buffer=shm.buf, offset=offset)
+    offset += valid.nbytes
+
+    synthetic: np.ndarray = np.ndarray((n, m), dtype=bool, buffer=shm.buf, offset=offset)
+
+    return data, timestamps, valid, synthetic
+
+
+class TradingCalendar:
+    """
+    交易时段日历
+
+    Lookup tables from minute of day to index of the minute in trading day,
+    precomputed from trading sessions starting with night session.
+    """
+
+    def __init__(self, sessions: List[Tuple[time, time]]):
+        """Constructor"""
+        self.sessions: List[Tuple[time, time]] = sessions
+
+        # Index of minute in trading day, -1 if not in any session
+        self.minute_index: List[int] = [-1] * 1440
+
+        # Session number of minute in trading day
+        self.minute_session: List[int] = [-1] * 1440
+
+        ix: int = 0
+
+        for n, (start, end) in enumerate(sessions):
+            start_minute: int = start.hour * 60 + start.minute
+            end_minute: int = end.hour * 60 + end.minute
+
+            # Session crossing midnight is wrapped
+            count: int = (end_minute - start_minute) % 1440
+
+            for i in range(count):
+                minute: int = (start_minute + i) % 1440
+                self.minute_index[minute] = ix
+                self.minute_session[minute] = n
+                ix += 1
+
+        self.day_minutes: int = ix
+
+        self.tables: Dict[Tuple[int, bool], Tuple[List[int], List[bool]]] = {}
+
+    def get_tables(self, window: int, flush_session: bool) -> Tuple[List[int], List[bool]]:
+        """
+        Get window group and window close flag of each minute of day.
+        """
+        key: tuple = (window, flush_session)
+        if key in self.tables:
+            return self.tables[key]
+
+        groups: List[int] = [-1] * 1440
+        closes: List[bool] = [False] * 1440
+
+        # Last minute index of each session
+        session_ends: Dict[int, int] = {}
+        for minute, ix in enumerate(self.minute_index):
+            if ix >= 0:
+                session: int = self.minute_session[minute]
+                session_ends[session] = max(session_ends.get(session, -1), ix)
+
+        for minute, ix in enumerate(self.minute_index):
+            if ix < 0:
+                continue
+
+            session = self.minute_session[minute]
+            groups[minute] = ix // window
+
+            if flush_session:
+                groups[minute] = groups[minute] * len(self.sessions) + session
+
+            closes[minute] = (
+                not (ix + 1) % window
+                or ix == self.day_minutes - 1
+                or (flush_session and ix == session_ends[session])
+            )
+
+        self.tables[key] = (groups, closes)
+        return groups, closes
+
+    def get_scheduler(self, window: int, flush_session: bool = True) -> "WindowScheduler":
+        """
+        Create a scheduler of window minutes, partial window is flushed at
+        the end of each session if flush_session is True.
+        """
+        groups, closes = self.get_tables(window, flush_session)
+        return WindowScheduler(self.minute_index, groups, closes)
+
+
+class WindowScheduler:
+    """
+    Index based window scheduler driven by trading calendar tables.
+    """
+
+    def __init__(self, minute_index: List[int], groups: List[int], closes: List[bool]):
+        """Constructor"""
+        self.minute_index: List[int] = minute_index
+        self.groups: List[int] = groups
+        self.closes: List[bool] = closes
+
+        self.group: int = -1
+        self.last_ix: int = -1
+
+    def update(self, dt: datetime) -> Tuple[bool, bool, bool]:
+        """
+        Return whether the bar is accepted, whether pending window should
+        be flushed before the bar, and whether window is closed after the
+        bar. Bars out of sessions are merged into the window still open,
+        or dropped if there is none, so that they never start a window.
+        """
+        minute: int = dt.hour * 60 + dt.minute
+
+        ix: int = self.minute_index[minute]
+        if ix < 0:
+            return self.group >= 0, False, False
+
+        # Window of another group or another trading day started
+        group: int = self.groups[minute]
+        flush: bool = self.group >= 0 and (group != self.group or ix < self.last_ix)
+
+        self.group = group
+        self.last_ix = ix
+
+        close: bool = self.closes[minute]
+        if close:
+            self.group = -1
+
+        return True, flush, close
+
+
+CHINA_FUTURES_SESSIONS: List[Tuple[time, time]] = [
+    (time(9, 0), time(10, 15)),
+    (time(10, 30), time(11, 30)),
+    (time(13, 30), time(15, 0))
+]
+
+CHINA_STOCK_SESSIONS: List[Tuple[time, time]] = [
+    (time(9, 30), time(11, 30)),
+    (time(13, 0), time(15, 0))
+]
+
+EXCHANGE_SESSIONS: Dict[Exchange, List[Tuple[time, time]]] = {
+    Exchange.SHFE: CHINA_FUTURES_SESSIONS,
+    Exchange.INE: CHINA_FUTURES_SESSIONS,
+    Exchange.DCE: CHINA_FUTURES_SESSIONS,
+    Exchange.CZCE: CHINA_FUTURES_SESSIONS,
+    Exchange.GFEX: CHINA_FUTURES_SESSIONS,
+    Exchange.CFFEX: CHINA_STOCK_SESSIONS,
+    Exchange.SSE: CHINA_STOCK_SESSIONS,
+    Exchange.SZSE: CHINA_STOCK_SESSIONS
+}
+
+trading_calendars: Dict[tuple, TradingCalendar] = {}
+
+
+def get_trading_calendar(
+    exchange: Exchange,
+    night_session: Tuple[time, time] = None
+) -> TradingCalendar:
+    """
+    Get trading calendar of exchange day sessions, with night session of
+    the product if it has one.
+    """
+    key: tuple = (exchange, night_session)
+
+    calendar: TradingCalendar = trading_calendars.get(key, None)
+    if not calendar:
+        sessions: list = list(EXCHANGE_SESSIONS[exchange])
+        if night_session:
+            sessions.insert(0, night_session)
+
+        calendar = TradingCalendar(sessions)
+        trading_calendars[key] = calendar
+
+    return calendar
 
 
 class PortfolioBarGenerator:
@@ -12,7 +570,8 @@ class PortfolioBarGenerator:
         on_bars: Callable,
         window: int = 0,
         on_window_bars: Callable = None,
-        interval: Interval = Interval.MINUTE
+        interval: Interval = Interval.MINUTE,
+        calendar: TradingCalendar = None
     ):
         """Constructor"""
         self.on_bars: Callable = on_bars
@@ -30,19 +589,30 @@ class PortfolioBarGenerator:
         self.window_bars: Dict[str, BarData] = {}
         self.on_window_bars: Callable = on_window_bars
 
+        # Windows are closed by trading sessions if calendar provided
+        self.scheduler: WindowScheduler = None
+        if calendar and window:
+            if interval == Interval.HOUR:
+                self.scheduler = calendar.get_scheduler(window * 60)
+            else:
+                self.scheduler = calendar.get_scheduler(window)
+
         self.last_dt: datetime = None
 
+        # End of the minute already pushed by flush
+        self.flush_dt: datetime = None
+
     def update_tick(self, tick: TickData) -> None:
         """"""
         if not tick.last_price:
             return
 
-        if self.last_dt and self.last_dt.minute != tick.datetime.minute:
-            for bar in self.bars.values():
-                bar.datetime = bar.datetime.replace(second=0, microsecond=0)
+        # Tick of minute already flushed is too late to be included
+        if self.flush_dt and tick.datetime < self.flush_dt:
+            return
 
-            self.on_bars(self.bars)
-            self.bars = {}
+        if self.bars and self.last_dt.minute != tick.datetime.minute:
+            self.push_bars()
 
         bar = self.bars.get(tick.vt_symbol, None)
         if not bar:
@@ -74,17 +644,81 @@ class PortfolioBarGenerator:
         self.last_ticks[tick.vt_symbol] = tick
         self.last_dt = tick.datetime
 
+    def flush(self, now: datetime = None, grace: float = 0) -> None:
+        """
+        Push bars of last minute by wall-clock time if no tick of next
+        minute arrived within grace seconds after the minute ended.
+        """
+        if not self.bars:
+            return
+
+        if not now:
+            now = datetime.now(self.last_dt.tzinfo)
+
+        end: datetime = self.last_dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if now < end + timedelta(seconds=grace):
+            return
+
+        self.flush_dt = end
+        self.push_bars()
+
+    def push_bars(self) -> None:
+        """"""
+        for bar in self.bars.values():
+            bar.datetime = bar.datetime.replace(second=0, microsecond=0)
+
+        self.on_bars(self.bars)
+        self.bars = {}
+
     def update_bars(self, bars: Dict[str, BarData]) -> None:
         """
         Update 1 minute bars into generator
         """
-        if self.interval == Interval.MINUTE:
+        if self.scheduler:
+            self.update_bar_session_window(bars)
+        elif self.interval == Interval.MINUTE:
             self.update_bar_minute_window(bars)
         else:
             self.update_bar_hour_window(bars)
 
     def update_bar_minute_window(self, bars: Dict[str, BarData]) -> None:
         """"""
+        self.update_window_bars(bars)
+
+        # Check if window bar completed
+        dt: datetime = next(iter(bars.values())).datetime
+        if not (dt.minute + 1) % self.window:
+            self.on_window_bars(self.window_bars)
+            self.window_bars = {}
+
+    def update_bar_session_window(self, bars: Dict[str, BarData]) -> None:
+        """
+        Update bars into window closed by trading session scheduler.
+        """
+        if not bars:
+            return
+
+        dt: datetime = next(iter(bars.values())).datetime
+
+        accept, flush, close = self.scheduler.update(dt)
+        if not accept:
+            return
+
+        # Push partial window not closed at its last minute
+        if flush and self.window_bars:
+            self.on_window_bars(self.window_bars)
+            self.window_bars = {}
+
+        self.update_window_bars(bars)
+
+        if close:
+            self.on_window_bars(self.window_bars)
+            self.window_bars = {}
+
+    def update_window_bars(self, bars: Dict[str, BarData]) -> None:
+        """
+        Update 1 minute bars into window bars.
+        """
         for vt_symbol, bar in bars.items():
             window_bar = self.window_bars.get(vt_symbol, None)
 
@@ -119,11 +753,6 @@ class PortfolioBarGenerator:
             window_bar.turnover += bar.turnover
             window_bar.open_interest = bar.open_interest
 
-        # Check if window bar completed
-        if not (bar.datetime.minute + 1) % self.window:
-            self.on_window_bars(self.window_bars)
-            self.window_bars = {}
-
     def update_bar_hour_window(self, bars: Dict[str, BarData]) -> None:
         """"""
         for vt_symbol, bar in bars.items():
@@ -246,3 +875,377 @@ class PortfolioBarGenerator:
                 self.interval_count = 0
                 self.on_window_bars(self.window_bars)
                 self.window_bars = {}
+
+
+class PortfolioArrayGenerator:
+    """
+    组合数组K线生成器
+
+    Aggregate 1 minute bars of all symbols into window bars, with OHLCV
+    of each symbol slot kept in NumPy vectors. Finished window bars are
+    pushed as a PortfolioBarArray of one row.
+    """
+
+    def __init__(
+        self,
+        vt_symbols: List[str],
+        window: int,
+        on_window_bars: Callable,
+        interval: Interval = Interval.MINUTE,
+        gateway_name: str = "",
+        calendar: TradingCalendar = None
+    ):
+        """Constructor"""
+        self.vt_symbols: List[str] = list(vt_symbols)
+        self.symbol_index: Dict[str, int] = {
+            vt_symbol: ix for ix, vt_symbol in enumerate(self.vt_symbols)
+        }
+
+        self.window: int = window
+        self.on_window_bars: Callable = on_window_bars
+        self.interval: Interval = interval
+        self.gateway_name: str = gateway_name
+        self.interval_count: int = 0
+
+        # Hour or daily bar being aggregated before merged into window
+        self.period_data, self.period_valid = self.new_buffer()
+        self.period_dt: datetime = None
+
+        self.window_data, self.window_valid = self.new_buffer()
+        self.window_dt: datetime = None
+
+        # Windows are closed by trading sessions if calendar provided, daily
+        # bar is finished at the end of trading day.
+        self.scheduler: WindowScheduler = None
+        if calendar:
+            if interval == Interval.DAILY:
+                self.scheduler = calendar.get_scheduler(calendar.day_minutes, False)
+            elif interval == Interval.HOUR:
+                self.scheduler = calendar.get_scheduler(window * 60)
+            else:
+                self.scheduler = calendar.get_scheduler(window)
+
+    def new_buffer(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Create (7, n_symbols) buffer with valid mask for aggregation.
+        """
+        data: np.ndarray = np.zeros((len(BAR_FIELDS), len(self.vt_symbols)), dtype=np.float64)
+        data[0] = np.nan
+        data[1] = -np.inf
+        data[2] = np.inf
+        data[3] = np.nan
+        data[6] = np.nan
+
+        valid: np.ndarray = np.zeros(len(self.vt_symbols), dtype=bool)
+        return data, valid
+
+    def update_bars(self, bars: Dict[str, BarData]) -> None:
+        """
+        Update 1 minute bars of a datetime into generator.
+        """
+        if not bars:
+            return
+
+        if not self.gateway_name:
+            self.gateway_name = next(iter(bars.values())).gateway_name
+
+        dt, values, valid = bars_to_columns(bars, self.symbol_index)
+        self.update_array(dt, values, valid)
+
+    def update_array(self, dt: datetime, values: np.ndarray, valid: np.ndarray) -> None:
+        """
+        Update (7, n_symbols) values of 1 minute bars with valid mask.
+        """
+        if self.scheduler:
+            self.update_session_array(dt, values, valid)
+        elif self.interval == Interval.MINUTE:
+            if not self.window_dt:
+                self.window_dt = dt.replace(second=0, microsecond=0)
+
+            fold_array(self.window_data, self.window_valid, values, valid)
+
+            # Check if window bar completed
+            if not (dt.minute + 1) % self.window:
+                self.push_window()
+        elif self.interval == Interval.HOUR:
+            # Bar of new hour arrived before last hour finished
+            if self.period_dt and dt.hour != self.period_dt.hour:
+                self.finish_period()
+
+            if not self.period_dt:
+                self.period_dt = dt.replace(minute=0, second=0, microsecond=0)
+
+            fold_array(self.period_data, self.period_valid, values, valid)
+
+            if dt.minute == 59:
+                self.finish_period()
+        else:
+            # Daily bar finished when bar of new date arrived
+            if self.period_dt and dt.date() != self.period_dt.date():
+                self.finish_period()
+
+            if not self.period_dt:
+                self.period_dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+            fold_array(self.period_data, self.period_valid, values, valid)
+
+    def update_session_array(self, dt: datetime, values: np.ndarray, valid: np.ndarray) -> None:
+        """
+        Update values into window closed by trading session scheduler.
+        """
+        accept, flush, close = self.scheduler.update(dt)
+        if not accept:
+            return
+
+        if self.interval == Interval.DAILY:
+            if flush and self.period_dt:
+                self.finish_period()
+
+            if not self.period_dt:
+                self.period_dt = dt.replace(second=0, microsecond=0)
+
+            fold_array(self.period_data, self.period_valid, values, valid)
+
+            if close:
+                self.finish_period()
+        else:
+            if flush and self.window_dt:
+                self.push_window()
+
+            if not self.window_dt:
+                self.window_dt = dt.replace(second=0, microsecond=0)
+
+            fold_array(self.window_data, self.window_valid, values, valid)
+
+            if close:
+                self.push_window()
+
+    def finish_period(self) -> None:
+        """
+        Merge finished hour or daily bar into window bar.
+        """
+        if not self.window_dt:
+            self.window_dt = self.period_dt
+
+        fold_array(self.window_data, self.window_valid, self.period_data, self.period_valid)
+
+        self.period_data, self.period_valid = self.new_buffer()
+        self.period_dt = None
+
+        self.interval_count += 1
+        if not self.interval_count % self.window:
+            self.interval_count = 0
+            self.push_window()
+
+    def push_window(self) -> None:
+        """"""
+        data: np.ndarray = self.window_data
+        valid: np.ndarray = self.window_valid
+        data[:, ~valid] = np.nan
+
+        window_array: PortfolioBarArray = PortfolioBarArray(
+            self.vt_symbols,
+            [self.window_dt],
+            self.interval,
+            self.gateway_name,
+            data.reshape(len(BAR_FIELDS), 1, len(self.vt_symbols)),
+            valid.reshape(1, len(self.vt_symbols))
+        )
+
+        self.window_data, self.window_valid = self.new_buffer()
+        self.window_dt = None
+
+        self.on_window_bars(window_array)
+
+
+class PortfolioBarFanout:
+    """
+    组合K线分发器
+
+    Build 1 minute bars of a vt_symbol set once, and push window bars of
+    every registered window to all its subscribers.
+    """
+
+    def __init__(self, vt_symbols: List[str]):
+        """Constructor"""
+        self.vt_symbols: List[str] = list(vt_symbols)
+        self.symbol_index: Dict[str, int] = {
+            vt_symbol: ix for ix, vt_symbol in enumerate(self.vt_symbols)
+        }
+
+        self.bar_generator: PortfolioBarGenerator = PortfolioBarGenerator(self.update_bars)
+
+        # Subscribers of 1 minute bars dict
+        self.bar_callbacks: List[Callable] = []
+
+        # Generators and subscribers of window bars array, keyed by window,
+        # interval and trading calendar
+        self.generators: Dict[tuple, PortfolioArrayGenerator] = {}
+        self.window_callbacks: Dict[tuple, List[Callable]] = defaultdict(list)
+
+    def subscribe(
+        self,
+        callback: Callable,
+        window: int = 1,
+        interval: Interval = Interval.MINUTE,
+        calendar: TradingCalendar = None
+    ) -> None:
+        """
+        Subscribe 1 minute bars dict, or window bars array of N minute,
+        N hour or N day. Windows are closed by trading sessions if calendar
+        provided.
+        """
+        if window == 1 and interval == Interval.MINUTE:
+            self.bar_callbacks.append(callback)
+            return
+
+        key: tuple = (window, interval, calendar)
+
+        if key not in self.generators:
+            self.generators[key] = PortfolioArrayGenerator(
+                self.vt_symbols,
+                window,
+                partial(self.push_window, key),
+                interval,
+                calendar=calendar
+            )
+
+        self.window_callbacks[key].append(callback)
+
+    def unsubscribe(self, callback: Callable) -> None:
+        """"""
+        if callback in self.bar_callbacks:
+            self.bar_callbacks.remove(callback)
+
+        for key, callbacks in list(self.window_callbacks.items()):
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+            if not callbacks:
+                self.window_callbacks.pop(key)
+                self.generators.pop(key)
+
+    def is_empty(self) -> bool:
+        """"""
+        return not self.bar_callbacks and not self.window_callbacks
+
+    def update_tick(self, tick: TickData) -> None:
+        """"""
+        self.bar_generator.update_tick(tick)
+
+    def flush(self, now: datetime = None, grace: float = 0) -> None:
+        """"""
+        self.bar_generator.flush(now, grace)
+
+    def update_bars(self, bars: Dict[str, BarData]) -> None:
+        """
+        Update 1 minute bars, which are converted into arrays only once
+        for all window generators.
+        """
+        if not bars:
+            return
+
+        for callback in self.bar_callbacks:
+            callback(bars)
+
+        if not self.generators:
+            return
+
+        dt, values, valid = bars_to_columns(bars, self.symbol_index)
+        self.update_columns(dt, values, valid, next(iter(bars.values())).gateway_name)
+
+    def update_history(self, history_data: PortfolioBarArray) -> None:
+        """
+        Update history data row by row, backfilled bars are skipped as only
+        real bars are received in live trading. Bars dict is only created
+        for subscribers of 1 minute bars.
+        """
+        cols: List[int] = [history_data.symbol_index[vt_symbol] for vt_symbol in self.vt_symbols]
+        mask: np.ndarray = history_data.valid[:, cols]
+
+        for ix, dt in enumerate(history_data.dts):
+            if not mask[ix].any():
+                continue
+
+            if self.bar_callbacks:
+                bars: Dict[str, BarData] = {
+                    vt_symbol: history_data.get_bar(ix, col)
+                    for vt_symbol, col, valid in zip(self.vt_symbols, cols, mask[ix])
+                    if valid
+                }
+
+                for callback in self.bar_callbacks:
+                    callback(bars)
+
+            if self.generators:
+                values: np.ndarray = history_data.data[:, ix, cols]
+                self.update_columns(dt, values, mask[ix], history_data.gateway_name)
+
+    def update_columns(
+        self,
+        dt: datetime,
+        values: np.ndarray,
+        valid: np.ndarray,
+        gateway_name: str
+    ) -> None:
+        """"""
+        for generator in list(self.generators.values()):
+            if not generator.gateway_name:
+                generator.gateway_name = gateway_name
+
+            generator.update_array(dt, values, valid)
+
+    def push_window(self, key: tuple, window_array: PortfolioBarArray) -> None:
+        """"""
+        for callback in list(self.window_callbacks[key]):
+            callback(window_array)
+
+
+def bars_to_columns(
+    bars: Dict[str, BarData],
+    symbol_index: Dict[str, int]
+) -> Tuple[datetime, np.ndarray, np.ndarray]:
+    """
+    Convert bars dict of a datetime into (7, n_symbols) values and valid mask.
+    """
+    values: np.ndarray = np.full((len(BAR_FIELDS), len(symbol_index)), np.nan)
+    valid: np.ndarray = np.zeros(len(symbol_index), dtype=bool)
+
+    for vt_symbol, bar in bars.items():
+        col: int = symbol_index.get(vt_symbol, None)
+        if col is None:
+            continue
+
+        values[:, col] = (
+            bar.open_price,
+            bar.high_price,
+            bar.low_price,
+            bar.close_price,
+            bar.volume,
+            bar.turnover,
+            bar.open_interest
+        )
+        valid[col] = True
+
+    return bar.datetime, values, valid
+
+
+def fold_array(
+    data: np.ndarray,
+    valid: np.ndarray,
+    values: np.ndarray,
+    mask: np.ndarray
+) -> None:
+    """
+    Fold bar values of symbols in mask into aggregation buffer in place.
+    """
+    first: np.ndarray = mask & ~valid
+
+    data[0] = np.where(first, values[0], data[0])
+    data[1] = np.where(mask, np.maximum(data[1], values[1]), data[1])
+    data[2] = np.where(mask, np.minimum(data[2], values[2]), data[2])
+    data[3] = np.where(mask, values[3], data[3])
+    data[4:6] += np.where(mask, values[4:6], 0)
+    data[6] = np.where(mask, values[6], data[6])
+
+    valid |= mask